@@ -0,0 +1,155 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+# Kept out of the source tree, next to the result cache
+HISTORY_PATH = Path(os.environ.get("QSS_BENCHMARK_HISTORY", Path.home() / ".cache" / "qss-benchmark" / "history.jsonl"))
+RECIPIENT_COUNTS = list(range(1, 11))
+FIDELITIES = [0.9, 0.99, 1.0]
+KEY_BLOCK_SIZES = [1 << 16, 1 << 20]
+
+def _time_per_call(fn, repeats: int) -> float:
+    start = time.perf_counter()
+    for _ in range(repeats):
+        fn()
+    return (time.perf_counter() - start) / repeats
+
+def _recipients(count: int):
+    return [f"r{i}" for i in range(count)]
+
+def bench_create_network(repeats: int):
+    from network import create_network
+    return {
+        f"create_network/{n}": _time_per_call(lambda: create_network("alice", _recipients(n), fidelity=0.99), repeats)
+        for n in RECIPIENT_COUNTS
+    }
+
+def bench_single_round(repeats: int):
+    from network import create_network
+    from simulate import run_single_round
+    metrics = {}
+    for n in RECIPIENT_COUNTS:
+        nodes, eve_node = create_network("alice", _recipients(n), fidelity=0.99)
+        metrics[f"run_single_round/{n}"] = _time_per_call(lambda: run_single_round(nodes, "alice", _recipients(n), eve_node), repeats)
+    return metrics
+
+def bench_run_simulation(n_rounds: int, engine: str):
+    from simulate import run_simulation
+    metrics = {}
+    for n in RECIPIENT_COUNTS:
+        recipients = _recipients(n)
+        for fidelity in FIDELITIES:
+            for eve_target in (None, recipients[0]):
+                start = time.perf_counter()
+                run_simulation("alice", recipients, n_rounds, eve_target=eve_target, fidelity=fidelity, engine=engine, results="none")
+                elapsed = time.perf_counter() - start
+                label = "eve" if eve_target else "clean"
+                metrics[f"run_simulation/{engine}/{n}/{fidelity}/{label}"] = elapsed / n_rounds
+    return metrics
+
+def _sweep_task(fidelity, n_rounds, engine, n_trials, first_trial=0):
+    from simulate import run_simulation
+    for i in range(first_trial, first_trial + n_trials):
+        run_simulation("alice", _recipients(3), n_rounds, fidelity=fidelity, engine=engine, results="none", seed=i)
+    return {"trials": [1] * n_trials}
+
+def bench_sweep(n_trials: int, n_rounds: int, engine: str):
+    from sweep import run_sweep
+    start = time.perf_counter()
+    run_sweep(_sweep_task, FIDELITIES, n_trials, args=(n_rounds, engine))
+    elapsed = time.perf_counter() - start
+    return {f"sweep/{engine}": elapsed / (n_trials * len(FIDELITIES))}
+
+def bench_privacy_amplification(repeats: int):
+    # Seconds per sifted key bit, so the metric stays comparable across block sizes
+    import numpy as np
+    from privacy_amplification import output_length, toeplitz_seed, toeplitz_hash
+    rng = np.random.default_rng(0)
+    metrics = {}
+    for n_bits in KEY_BLOCK_SIZES:
+        key = rng.integers(0, 2, size=n_bits, dtype=np.uint8)
+        out_bits = output_length(n_bits, 0.02)
+        toeplitz = toeplitz_seed(n_bits, out_bits, seed=0)
+        metrics[f"privacy_amplification/{n_bits}"] = _time_per_call(lambda: toeplitz_hash(key, toeplitz, out_bits), repeats) / n_bits
+    return metrics
+
+def bench_import_time(repeats: int):
+    # Fresh interpreters, as a spawned sweep worker or a short CLI run would pay it
+    source_dir = Path(__file__).parent
+    metrics = {}
+    for module in ("simulate", "main"):
+        start = time.perf_counter()
+        for _ in range(repeats):
+            subprocess.run([sys.executable, "-c", f"import {module}"], cwd=source_dir, check=True)
+        metrics[f"import/{module}"] = (time.perf_counter() - start) / repeats
+    return metrics
+
+def git_revision() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+def load_history(path: Path):
+    if not path.exists():
+        return []
+    return [json.loads(line) for line in path.read_text().splitlines() if line.strip()]
+
+def find_regressions(metrics, history, threshold: float, window: int = 5):
+    # All metrics are seconds per operation. Noise only ever makes a run slower, so the fastest of
+    # the last runs is the baseline; a median of a few short runs moves with the machine's load
+    regressions = []
+    for name, value in metrics.items():
+        previous = [entry["metrics"][name] for entry in history if name in entry["metrics"]][-window:]
+        if not previous:
+            continue
+        baseline = min(previous)
+        if value > baseline * (1 + threshold):
+            regressions.append((name, baseline, value))
+    return regressions
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the HBB99 simulation and track regressions.")
+    parser.add_argument("--quick", action="store_true", help="fewer rounds and repeats")
+    parser.add_argument("--engine", default="netsquid", choices=["netsquid", "sampler"])
+    parser.add_argument("--history", type=Path, default=HISTORY_PATH)
+    parser.add_argument("--threshold", type=float, default=0.2, help="relative slowdown reported as a regression")
+    parser.add_argument("--no-record", action="store_true", help="do not append this run to the history")
+    args = parser.parse_args(argv)
+
+    repeats = 10 if args.quick else 20
+    n_rounds = 16 if args.quick else 128
+    if args.engine == "sampler":
+        n_rounds *= 1000
+
+    metrics = bench_import_time(min(repeats, 5))
+    if args.engine == "netsquid":
+        metrics.update(bench_create_network(repeats))
+        metrics.update(bench_single_round(repeats))
+    metrics.update(bench_run_simulation(n_rounds, args.engine))
+    metrics.update(bench_sweep(4 if args.quick else 32, n_rounds, args.engine))
+    metrics.update(bench_privacy_amplification(min(repeats, 5)))
+
+    for name, value in metrics.items():
+        print(f"{name:<45} {value * 1e3:>12.4f} ms")
+
+    # Only runs of the same size are comparable
+    history = [entry for entry in load_history(args.history) if entry["quick"] == args.quick]
+    regressions = find_regressions(metrics, history, args.threshold)
+    for name, baseline, value in regressions:
+        print(f"REGRESSION {name}: {baseline * 1e3:.4f} ms -> {value * 1e3:.4f} ms ({value / baseline - 1:+.0%})")
+
+    if not args.no_record:
+        entry = {"time": time.strftime("%Y-%m-%dT%H:%M:%S"), "revision": git_revision(), "engine": args.engine, "quick": args.quick, "metrics": metrics}
+        args.history.parent.mkdir(parents=True, exist_ok=True)
+        with open(args.history, "a") as f:
+            f.write(json.dumps(entry) + "\n")
+
+    return 1 if regressions else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,36 @@
+from typing import Dict, List
+
+import numpy as np
+
+from sampler import BASES
+
+RESULT_FORMATS = ("none", "columnar", "dicts")
+
+def to_columnar(party_names: List[str], bases: np.ndarray, outcomes: np.ndarray, valid: np.ndarray, parity_passed: np.ndarray, ss_success: np.ndarray) -> Dict:
+    return {
+        "parties": list(party_names),
+        "bases": np.asarray(bases, dtype=np.int8),
+        "outcomes": np.packbits(np.asarray(outcomes, dtype=np.uint8), axis=1),
+        "valid": np.asarray(valid, dtype=bool),
+        "parity_passed": np.asarray(parity_passed, dtype=bool),
+        "secret_sharing_success": np.asarray(ss_success, dtype=bool),
+    }
+
+def unpack_outcomes(columnar: Dict) -> np.ndarray:
+    n_parties = len(columnar["parties"])
+    return np.unpackbits(columnar["outcomes"], axis=1, count=n_parties).astype(np.int8)
+
+def to_dicts(party_names: List[str], bases: np.ndarray, outcomes: np.ndarray, valid: np.ndarray, parity_passed: np.ndarray, ss_success: np.ndarray, reconstructed: np.ndarray, actual: np.ndarray) -> List[Dict]:
+    results_list = []
+    for i in range(len(bases)):
+        is_valid = bool(valid[i])
+        results_list.append({
+            "bases": {name: BASES[b] for name, b in zip(party_names, bases[i].tolist())},
+            "outcomes": dict(zip(party_names, outcomes[i].tolist())),
+            "valid": is_valid,
+            "parity_passed": bool(parity_passed[i]) if is_valid else None,
+            "secret_sharing_success": bool(ss_success[i]) if is_valid else None,
+            "reconstructed": int(reconstructed[i]) if is_valid else None,
+            "actual": int(actual[i]) if is_valid else None,
+        })
+    return results_list
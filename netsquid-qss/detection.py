@@ -0,0 +1,56 @@
+from math import log
+from typing import Dict, Iterable, List, Tuple
+
+from simulate import iter_simulation
+
+def eve_error_rate(clean_qber: float) -> float:
+    # A random-basis intercept-resend on one recipient flips the GHZ parity in 25% of the valid
+    # rounds, independently of the channel errors already present
+    return clean_qber + 0.25 - 2 * clean_qber * 0.25
+
+def sprt_thresholds(alpha: float, beta: float):
+    return log(beta / (1 - alpha)), log((1 - beta) / alpha)
+
+# Rounds simulated between two evaluations of the SPRT. Checking at batch boundaries lets the
+# multi-round protocol run a whole batch in one simulation, and overshoots a threshold by at
+# most one batch.
+SPRT_BATCH_ROUNDS = 32
+
+def sprt_decide(batch_counts: Iterable[Tuple[int, int]], p0: float, p1: float, alpha: float = 0.01, beta: float = 0.01) -> Dict:
+    # Wald's sequential probability ratio test of H0: error rate p0 (clean) against H1: error
+    # rate p1 (Eve present), fed with the (valid rounds, parity errors) of each batch and
+    # stopping at the first batch boundary where the log likelihood ratio crosses a threshold
+    p0 = min(max(p0, 1e-9), 1 - 1e-9)
+    p1 = min(max(p1, 1e-9), 1 - 1e-9)
+    lower, upper = sprt_thresholds(alpha, beta)
+    llr_error = log(p1 / p0)
+    llr_pass = log((1 - p1) / (1 - p0))
+
+    llr = 0.0
+    valid_rounds = 0
+    for batch_valid, batch_errors in batch_counts:
+        valid_rounds += batch_valid
+        llr += (batch_valid - batch_errors) * llr_pass + batch_errors * llr_error
+        if llr >= upper:
+            return {"decision": "eve", "valid_rounds": valid_rounds, "llr": llr}
+        if llr <= lower:
+            return {"decision": "clean", "valid_rounds": valid_rounds, "llr": llr}
+    return {"decision": "undecided", "valid_rounds": valid_rounds, "llr": llr}
+
+def sequential_eve_test(dealer_name: str, recipient_names: List[str], p0: float, p1: float = None, alpha: float = 0.01, beta: float = 0.01, eve_target: str = None, fidelity: float = 1.0, max_rounds: int = 10000, engine: str = "netsquid", batch_size: int = SPRT_BATCH_ROUNDS) -> Dict:
+    if p1 is None:
+        p1 = eve_error_rate(p0)
+    rounds = 0
+
+    def batch_counts():
+        # iter_simulation reports running totals, the test takes the counts of each batch
+        nonlocal rounds
+        valid_rounds = error_rounds = 0
+        for stats in iter_simulation(dealer_name, recipient_names, max_rounds, eve_target, fidelity, batch_size=batch_size, engine=engine):
+            rounds = stats["n_rounds"]
+            yield stats["valid_rounds"] - valid_rounds, stats["error_rounds"] - error_rounds
+            valid_rounds, error_rounds = stats["valid_rounds"], stats["error_rounds"]
+
+    outcome = sprt_decide(batch_counts(), p0, p1, alpha, beta)
+    outcome["rounds"] = rounds
+    return outcome
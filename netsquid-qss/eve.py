@@ -2,17 +2,21 @@ import random
 import netsquid as ns
 from netsquid.protocols import Protocol
 from netsquid.qubits import qubitapi as qapi
+from formalism import operate
 
 class EveInterceptProtocol(Protocol):
-    def __init__(self, eve_node, target_name: str, strategy: str = "random"):
+    def __init__(self, eve_node, target_name: str, strategy: str = "random", n_rounds: int = 1, dealer_name: str = "Alice"):
         super().__init__(name="EveIntercept")
         self.eve_node = eve_node
         self.target_name = target_name
+        self.dealer_name = dealer_name
         self.strategy = strategy
+        self.n_rounds = n_rounds
         self.memory = eve_node.subcomponents["memory"]
         self.basis = None
         self.outcome = None
         self.intercepted = False
+        self.history = []
 
     def _choose_basis(self):
         if self.strategy == "random":
@@ -24,29 +28,35 @@ class EveInterceptProtocol(Protocol):
 
     def _create_epr_pair(self):
         q_eve, q_target = qapi.create_qubits(2)
-        qapi.operate(q_eve, ns.H)
-        qapi.operate([q_eve, q_target], ns.CNOT)
+        operate(q_eve, ns.H)
+        operate([q_eve, q_target], ns.CNOT)
         return q_eve, q_target
 
     def _forward_to_target(self, measurement, basis):
         q = qapi.create_qubits(1)[0]
         if measurement == 1:
-            qapi.operate(q, ns.X)
+            operate(q, ns.X)
 
-        qapi.operate(q, ns.H)
+        operate(q, ns.H)
         if basis == "Y":
-            qapi.operate(q, ns.S)
+            operate(q, ns.S)
         return q
 
     def run(self):
-        input_port = self.eve_node.ports["q_port_fromAlice"]
-        yield self.await_port_input(input_port)
+        input_port = self.eve_node.ports[f"q_port_from{self.dealer_name}"]
+        for _ in range(self.n_rounds):
+            yield self.await_port_input(input_port)
 
-        msg = input_port.rx_input()
-        if not msg or not msg.items:
-            return
-        qubit = msg.items[0]
+            msg = input_port.rx_input()
+            if not msg or not msg.items:
+                return
+            qubit = msg.items[0]
 
+            qubit_for_target = self.intercept(qubit)
+            output_port = self.eve_node.ports[f"q_port_to{self.target_name}"]
+            output_port.tx_output(qubit_for_target)
+
+    def intercept(self, qubit):
         self.basis = self._choose_basis()
         if self.basis == "X":
             observable = ns.X
@@ -57,7 +67,6 @@ class EveInterceptProtocol(Protocol):
 
         self.outcome, _ = qapi.measure(qubit, observable=observable)
         self.intercepted = True
+        self.history.append((self.basis, self.outcome))
 
-        qubit_for_target = self._forward_to_target(self.outcome, self.basis)
-        output_port = self.eve_node.ports[f"q_port_to{self.target_name}"]
-        output_port.tx_output(qubit_for_target)
\ No newline at end of file
+        return self._forward_to_target(self.outcome, self.basis)
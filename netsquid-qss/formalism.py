@@ -0,0 +1,28 @@
+import netsquid as ns
+from netsquid.qubits import qubitapi as qapi
+
+FORMALISMS = {
+    "ket": ns.QFormalism.KET,
+    "dm": ns.QFormalism.DM,
+    "stab": ns.QFormalism.STAB,
+    "gslc": ns.QFormalism.GSLC,
+}
+
+# Gates the stabilizer formalisms can apply exactly
+CLIFFORD_OPERATORS = (ns.I, ns.X, ns.Y, ns.Z, ns.H, ns.S, ns.CNOT, ns.CZ)
+
+class NonCliffordOperationError(ValueError):
+    pass
+
+def set_formalism(formalism: str):
+    if formalism not in FORMALISMS:
+        raise ValueError(f"Unknown formalism: {formalism}. Choose from {', '.join(FORMALISMS)}")
+    ns.set_qstate_formalism(FORMALISMS[formalism])
+
+def is_stabilizer_formalism() -> bool:
+    return ns.get_qstate_formalism() in (ns.QFormalism.STAB, ns.QFormalism.GSLC)
+
+def operate(qubits, operator):
+    if is_stabilizer_formalism() and not any(operator is clifford for clifford in CLIFFORD_OPERATORS):
+        raise NonCliffordOperationError(f"{operator.name} is not a Clifford operation and cannot be simulated in the stabilizer formalism")
+    qapi.operate(qubits, operator)
@@ -1,32 +1,77 @@
 import netsquid as ns
 from netsquid.protocols import Protocol
+from netsquid.protocols.protocol import Signals
+from netsquid.qubits import qubitapi as qapi
 from netsquid.qubits.operators import H, CNOT
+from formalism import operate, set_formalism
+from instrumentation import record_qstate
+from network import depolar_probability
 
 class QubitReceiverProtocol(Protocol):
-    def __init__(self, node, port_name):
+    def __init__(self, node, port_name, n_rounds: int = 1):
         super().__init__(name=f"Receiver_{node.name}")
         self.node = node
         self.port_name = port_name
+        self.n_rounds = n_rounds
         self.memory = node.subcomponents["memory"]
         self.received = False
 
     def run(self):
         port = self.node.ports[self.port_name]
-        yield self.await_port_input(port)
-        msg = port.rx_input()
-        if msg and msg.items:
-            qubit = msg.items[0]
-            self.memory.put(qubit, [0])
-            self.received = True
+        for _ in range(self.n_rounds):
+            yield self.await_port_input(port)
+            msg = port.rx_input()
+            if msg and msg.items:
+                qubit = msg.items[0]
+                self.memory.put(qubit, [0])
+                self.received = True
+
+class GHZSourceProtocol(Protocol):
+    def __init__(self, nodes, dealer_name: str, recipient_names: list, dealer_protocol, n_rounds: int, eve_target: str = None, compiled_fidelity: float = None, eve_protocol=None, profile=None):
+        super().__init__(name=f"GHZSource_{dealer_name}")
+        self.nodes = nodes
+        self.dealer = nodes[dealer_name]
+        self.recipient_names = recipient_names
+        self.dealer_protocol = dealer_protocol
+        self.n_rounds = n_rounds
+        self.eve_target = eve_target
+        self.compiled_fidelity = compiled_fidelity
+        self.eve_protocol = eve_protocol
+        self.profile = profile
+        self.memory = self.dealer.subcomponents["memory"]
+
+    def run(self):
+        n_parties = 1 + len(self.recipient_names)
+        for _ in range(self.n_rounds):
+            qubits = create_ghz_state(n_parties)
+            record_qstate(self.profile, qubits[0])
+            if self.compiled_fidelity is not None:
+                self.memory.put(qubits[0], [0])
+                place_in_memories(self.nodes, self.recipient_names, qubits[1:], self.compiled_fidelity, self.eve_protocol, self.eve_target)
+                yield self.await_signal(self.dealer_protocol, Signals.SUCCESS)
+                continue
+
+            self.memory.put(qubits, list(range(n_parties)))
+
+            for i, recipient in enumerate(self.recipient_names):
+                qubit = self.memory.pop([i + 1])[0]
+                if recipient == self.eve_target:
+                    self.dealer.ports["q_port_toEve"].tx_output(qubit)
+                else:
+                    self.dealer.ports[f"q_port_to{recipient}"].tx_output(qubit)
+
+            yield self.await_signal(self.dealer_protocol, Signals.SUCCESS)
 
 def create_ghz_state(n_qubits: int):
     qubits = ns.qubits.create_qubits(n_qubits)
-    ns.qubits.operate(qubits[0], H)
+    operate(qubits[0], H)
     for i in range(1, n_qubits):
-        ns.qubits.operate([qubits[0], qubits[i]], CNOT)
+        operate([qubits[0], qubits[i]], CNOT)
     return qubits
 
-def distribute_ghz_state(nodes, dealer_name: str, recipient_names: list):
+def distribute_ghz_state(nodes, dealer_name: str, recipient_names: list, formalism: str = None):
+    if formalism is not None:
+        set_formalism(formalism)
     dealer = nodes[dealer_name]
     dealer_mem = dealer.subcomponents["memory"]
     n_parties = 1 + len(recipient_names)
@@ -44,10 +89,11 @@ def distribute_ghz_state(nodes, dealer_name: str, recipient_names: list):
         qubit = dealer_mem.pop([i + 1])[0]
         dealer.ports[f"q_port_to{recipient}"].tx_output(qubit)
 
-    ns.sim_run(duration=100)
     return receivers
 
-def distribute_ghz_with_eve(nodes, dealer_name: str, recipient_names: list, eve_node, eve_target: str, eve_protocol_class):
+def distribute_ghz_with_eve(nodes, dealer_name: str, recipient_names: list, eve_node, eve_target: str, eve_protocol_class, formalism: str = None):
+    if formalism is not None:
+        set_formalism(formalism)
     dealer = nodes[dealer_name]
     dealer_mem = dealer.subcomponents["memory"]
     n_parties = 1 + len(recipient_names)
@@ -66,7 +112,7 @@ def distribute_ghz_with_eve(nodes, dealer_name: str, recipient_names: list, eve_
         receiver.start()
         receivers.append(receiver)
 
-    eve_protocol = eve_protocol_class(eve_node, eve_target)
+    eve_protocol = eve_protocol_class(eve_node, eve_target, dealer_name=dealer_name)
     eve_protocol.start()
     for i, recipient in enumerate(recipient_names):
         qubit = dealer_mem.pop([i + 1])[0]
@@ -75,5 +121,24 @@ def distribute_ghz_with_eve(nodes, dealer_name: str, recipient_names: list, eve_
         else:
             dealer.ports[f"q_port_to{recipient}"].tx_output(qubit)
 
-    ns.sim_run(duration=100)
-    return eve_protocol, receivers
\ No newline at end of file
+    return eve_protocol, receivers
+
+# Compiled noise mode: the link depolarization a QuantumChannel would apply is applied right away
+# and the qubits are stored in the recipient memories without scheduling any channel events.
+# Eve's intercept-resend happens in place, with the Eve-to-target hop noiseless as in the network.
+def place_in_memories(nodes, recipient_names: list, qubits, fidelity: float, eve_protocol=None, eve_target: str = None):
+    prob = depolar_probability(fidelity)
+    for recipient, qubit in zip(recipient_names, qubits):
+        if prob > 0:
+            qapi.depolarize(qubit, prob=prob)
+        if eve_protocol is not None and recipient == eve_target:
+            qubit = eve_protocol.intercept(qubit)
+        nodes[recipient].subcomponents["memory"].put(qubit, [0])
+
+def distribute_ghz_direct(nodes, dealer_name: str, recipient_names: list, fidelity: float, eve_protocol=None, eve_target: str = None, formalism: str = None):
+    if formalism is not None:
+        set_formalism(formalism)
+
+    qubits = create_ghz_state(1 + len(recipient_names))
+    nodes[dealer_name].subcomponents["memory"].put(qubits[0], [0])
+    place_in_memories(nodes, recipient_names, qubits[1:], fidelity, eve_protocol, eve_target)
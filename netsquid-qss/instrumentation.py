@@ -0,0 +1,65 @@
+import json
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterable, Optional
+
+# Opt-in profile of where run_simulation spends its time. A profile is a plain dict so it can be
+# returned in the stats, pickled by the result cache and summed across process-pool workers.
+
+def new_profile() -> Dict:
+    return {"phases": {}, "max_qstate_qubits": 0}
+
+def _phase_entry(profile: Dict, name: str) -> Dict:
+    return profile["phases"].setdefault(name, {"calls": 0, "wall_time": 0.0, "events": 0, "sim_time": 0.0})
+
+@contextmanager
+def phase(profile: Optional[Dict], name: str):
+    if profile is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        entry = _phase_entry(profile, name)
+        entry["calls"] += 1
+        entry["wall_time"] += time.perf_counter() - start
+
+def record_sim_run(profile: Optional[Dict], name: str, sim_stats, sim_time: float):
+    if profile is None:
+        return
+    entry = _phase_entry(profile, name)
+    entry["sim_time"] += sim_time
+    # sim_stats is ns.sim_stats(), whose counters start at zero on every ns.sim_reset(). The
+    # profile is a diagnostic, so a netsquid version without the counter leaves the column empty
+    # rather than failing the run
+    events = getattr(sim_stats, "data", {}).get("events_handled")
+    if events is None or entry["events"] is None:
+        entry["events"] = None
+    else:
+        entry["events"] += int(events)
+
+def record_qstate(profile: Optional[Dict], qubit):
+    if profile is None or qubit is None or qubit.qstate is None:
+        return
+    profile["max_qstate_qubits"] = max(profile["max_qstate_qubits"], qubit.qstate.num_qubits)
+
+def merge_profiles(profiles: Iterable[Dict]) -> Dict:
+    merged = new_profile()
+    for profile in profiles:
+        if isinstance(profile, str):
+            profile = json.loads(profile)
+        for name, entry in profile["phases"].items():
+            total = _phase_entry(merged, name)
+            for key, value in entry.items():
+                total[key] = None if value is None or total[key] is None else total[key] + value
+        merged["max_qstate_qubits"] = max(merged["max_qstate_qubits"], profile["max_qstate_qubits"])
+    return merged
+
+def format_profile(profile: Dict) -> str:
+    total = sum(entry["wall_time"] for entry in profile["phases"].values()) or 1.0
+    lines = [f"{'Phase':<14} {'Calls':>8} {'Wall time':>12} {'Share':>7} {'Events':>10}"]
+    for name, entry in profile["phases"].items():
+        lines.append(f"{name:<14} {entry['calls']:>8} {entry['wall_time']:>11.3f}s {entry['wall_time'] / total:>7.1%} {'-' if entry['events'] is None else entry['events']:>10}")
+    lines.append(f"Largest qubit state: {profile['max_qstate_qubits']} qubits")
+    return "\n".join(lines)
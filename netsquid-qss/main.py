@@ -1,10 +1,11 @@
+import json
 import time
+import zlib
 from simulate import run_simulation
-from concurrent.futures import ProcessPoolExecutor, as_completed
-import matplotlib.pyplot as plt
+from instrumentation import merge_profiles, format_profile
+from result_cache import cached_run_simulation
+from sweep import run_sweep
 import numpy as np
-import multiprocessing as mp
-from scipy.stats import binom
 
 def basic():
     start_time = time.time()
@@ -13,6 +14,25 @@ def basic():
     print(f"QBER: {stats['qber']:.2f}%")
     print(f"Secret sharing rate: {stats['ss_rate']:.1f}%")
 
+def key_reconciliation():
+    from columnar import unpack_outcomes
+    from reconciliation import sifted_bits, cascade
+    from privacy_amplification import amplify
+
+    stats = run_simulation("Alice", ["Bob", "Charlie"], n_rounds=1_000_000, fidelity=0.99, engine="sampler", results="columnar")
+    columnar = stats['results']
+    dealer_bits, recipient_bits = sifted_bits(columnar['bases'], unpack_outcomes(columnar))
+
+    result = cascade(dealer_bits, recipient_bits, stats['qber'] / 100)
+    print(f"QBER: {stats['qber']:.2f}%")
+    print(f"Sifted bits: {result['n_bits']}, leaked: {result['leaked_bits']}, round trips: {result['round_trips']}")
+    print(f"Residual errors: {result['residual_errors']}")
+    print(f"Throughput: {result['bits_per_second'] / 1e6:.2f} Mbit/s")
+
+    start_time = time.time()
+    secret_key = amplify(result['key'], stats['qber'] / 100, leaked_bits=result['leaked_bits'], seed=0)
+    print(f"Secret key: {len(secret_key)} bits ({time.time() - start_time:.2f}s)")
+
 def vary_recipients():
     start_time = time.time()
 
@@ -30,35 +50,48 @@ def vary_recipients():
 
     print(f"\nSimulation time: {time.time() - start_time:.2f}s")
 
-def simulate_fidelity_qber(fidelity: float):
+def _with_profile(result, profiles):
+    # Profiles travel back from the workers (and into sweep stores) as one JSON string per chunk
+    if profiles:
+        result['profile'] = [json.dumps(merge_profiles(profiles))]
+    return result
+
+def _trial_seed(*key) -> int:
+    # Distinct for every sweep point, trial and kind of run, and stable across processes (unlike hash)
+    return zlib.crc32(repr(key).encode())
+
+def _print_profile(results):
+    profiles = [p for result in results.values() for p in result.get('profile', [])]
+    if profiles:
+        print("\nPhase profile:")
+        print(format_profile(merge_profiles(profiles)))
+
+def simulate_fidelity_qber(fidelity: float, n_trials: int = 512, first_trial: int = 0, profile: bool = False):
     qbers = []
     valid_round_counts = []
-    for i in range(512):
-        stats = run_simulation("Alice", ["Bob", "Charlie", "Diana"], n_rounds=256, eve_target=None, fidelity=fidelity)
+    profiles = []
+    for i in range(first_trial, first_trial + n_trials):
+        stats = cached_run_simulation("Alice", ["Bob", "Charlie", "Diana"], n_rounds=256, eve_target=None, fidelity=fidelity, results="none", seed=_trial_seed(fidelity, i), profile=profile)
         qbers.append(stats['qber'] / 100)
         valid_round_counts.append(stats['valid_rounds'])
+        if profile:
+            profiles.append(stats['profile'])
 
-    return fidelity, qbers, valid_round_counts
+    return _with_profile({'qbers': qbers, 'valid_round_counts': valid_round_counts}, profiles)
 
 
-def plot_fidelities():
+def plot_fidelities(store=None, profile=False):
+    # Plotting and scipy are imported here, not at module level, so spawned sweep workers that re-import main do not load them
+    import matplotlib.pyplot as plt
+    from scipy.stats import binom
+
     fidelities = [0.75, 0.90, 0.95, 0.99, 0.999]
-    qbers_per_fidelity = {}
-    valid_round_counts_per_fidelity = {}
-
-    mp.set_start_method("spawn", force=True)
-    with ProcessPoolExecutor() as executor:
-        futures = [
-            executor.submit(simulate_fidelity_qber, fidelity)
-            for fidelity in fidelities
-        ]
-        for future in as_completed(futures):
-            fidelity, qbers, valid_round_counts = future.result()
-            qbers_per_fidelity[fidelity] = qbers
-            valid_round_counts_per_fidelity[fidelity] = valid_round_counts
-
-    qbers_per_fidelity = [qbers_per_fidelity[f] for f in fidelities]
-    valid_round_counts_per_fidelity = [valid_round_counts_per_fidelity[f] for f in fidelities]
+    warm = [("Alice", ["Bob", "Charlie", "Diana"], None, fidelities[0])]
+    results = run_sweep(simulate_fidelity_qber, fidelities, n_trials=512, store=store, kwargs={'profile': profile}, warm_networks=warm)
+    _print_profile(results)
+
+    qbers_per_fidelity = [results[f]['qbers'] for f in fidelities]
+    valid_round_counts_per_fidelity = [results[f]['valid_round_counts'] for f in fidelities]
     fidelity_labels = [f"{f*100:.1f}%" for f in fidelities]
 
     plt.boxplot(qbers_per_fidelity, tick_labels=fidelity_labels, showmeans=True)
@@ -83,24 +116,30 @@ def plot_fidelities():
         p_values = binom.sf(error_counts - 1, valid_round_counts, np.mean(qbers))
         print(f"\tP value fails: {np.sum(p_values < 0.05)} / {len(p_values)}")
 
-def simulate_eve_impact(fidelity, recipients, n_trials):
+def simulate_eve_impact(fidelity, recipients, n_trials, first_trial=0, profile=False):
     qbers_clean = []
     valid_rounds_clean = []
     qbers_eve = []
     valid_rounds_eve = []
+    profiles = []
 
-    for i in range(n_trials):
-        print(f"\nFidelity {fidelity*100:.1f}% round {i+1}/{n_trials}")
-        stats_clean = run_simulation("Alice", recipients, 128, fidelity=fidelity)
-        stats_eve = run_simulation("Alice", recipients, 128, fidelity=fidelity, eve_target=recipients[0])
+    for i in range(first_trial, first_trial + n_trials):
+        print(f"\nFidelity {fidelity*100:.1f}% trial {i+1}")
+        stats_clean = cached_run_simulation("Alice", recipients, 128, fidelity=fidelity, results="none", seed=_trial_seed(fidelity, i, "clean"), profile=profile)
+        stats_eve = cached_run_simulation("Alice", recipients, 128, fidelity=fidelity, eve_target=recipients[0], results="none", seed=_trial_seed(fidelity, i, "eve"), profile=profile)
         qbers_clean.append(stats_clean['qber'] / 100)
         valid_rounds_clean.append(stats_clean['valid_rounds'])
         qbers_eve.append(stats_eve['qber'] / 100)
         valid_rounds_eve.append(stats_eve['valid_rounds'])
+        if profile:
+            profiles.extend([stats_clean['profile'], stats_eve['profile']])
 
-    return fidelity, {'clean_qbers': qbers_clean, 'clean_valid_rounds': valid_rounds_clean, 'eve_qbers': qbers_eve, 'eve_valid_rounds': valid_rounds_eve}
+    return _with_profile({'clean_qbers': qbers_clean, 'clean_valid_rounds': valid_rounds_clean, 'eve_qbers': qbers_eve, 'eve_valid_rounds': valid_rounds_eve}, profiles)
+
+def plot_eve_impact_fidelity(fidelities=None, recipients=None, n_trials=16, store=None, profile=False):
+    import matplotlib.pyplot as plt
+    from scipy.stats import binom
 
-def plot_eve_impact_fidelity(fidelities=None, recipients=None, n_trials=16):
     if fidelities is None:
         fidelities = [0.75, 0.90, 0.95, 0.99, 0.999]
 
@@ -112,17 +151,9 @@ def plot_eve_impact_fidelity(fidelities=None, recipients=None, n_trials=16):
         recipients = [chr(66 + i) for i in range(recipients)]  # B, C, D, E, F, G, H
 
     start_time = time.time()
-    results = {}
-
-    mp.set_start_method("spawn", force=True)
-    with ProcessPoolExecutor() as executor:
-        futures = [
-            executor.submit(simulate_eve_impact, fidelity, recipients, n_trials)
-            for fidelity in fidelities
-        ]
-        for future in as_completed(futures):
-            fidelity, result = future.result()
-            results[fidelity] = result
+    warm = [("Alice", recipients, None, fidelities[0]), ("Alice", recipients, recipients[0], fidelities[0])]
+    results = run_sweep(simulate_eve_impact, fidelities, n_trials, args=(recipients,), store=store, kwargs={'profile': profile}, warm_networks=warm)
+    _print_profile(results)
 
     qbers_clean_list = [results[f]['clean_qbers'] for f in fidelities]
     qbers_eve_list = [results[f]['eve_qbers'] for f in fidelities]
@@ -185,33 +216,36 @@ def plot_eve_impact_fidelity(fidelities=None, recipients=None, n_trials=16):
         print(f"\tFalse positive rate: {clean_p_fails / len(p_values_clean) * 100:.1f}%")
         print(f"\tFalse negative rate: {(1 - eve_p_fails / len(p_values_eve)) * 100:.1f}%")
 
-def simulate_recipient_count_qber(recipient_count: int):
+def simulate_recipient_count_qber(recipient_count: int, n_trials: int = 512, first_trial: int = 0, profile: bool = False):
     recipients = [f"r{i}" for i in range(recipient_count)]
     qbers = []
-    for _ in range(512):
-        stats = run_simulation(
+    profiles = []
+    for i in range(first_trial, first_trial + n_trials):
+        stats = cached_run_simulation(
             "alice",
             recipients,
             n_rounds=128,
             eve_target=None,
-            fidelity=0.99
+            fidelity=0.99,
+            results="none",
+            seed=_trial_seed(recipient_count, i),
+            profile=profile
         )
         qbers.append(stats['qber'] / 100)
+        if profile:
+            profiles.append(stats['profile'])
 
-    return recipient_count, qbers
+    return _with_profile({'qbers': qbers}, profiles)
 
-def plot_recipient_counts():
-    recipient_counts = [2, 3, 4, 5, 6, 7, 8, 9, 10]
-    qbers_per_count = {}
-    with ProcessPoolExecutor() as executor:
-        futures = [
-            executor.submit(simulate_recipient_count_qber, recipient_count)
-            for recipient_count in recipient_counts
-        ]
+def plot_recipient_counts(store=None, profile=False):
+    import matplotlib.pyplot as plt
 
-        for future in as_completed(futures):
-            recipient_count, qbers = future.result()
-            qbers_per_count[recipient_count] = qbers
+    recipient_counts = [2, 3, 4, 5, 6, 7, 8, 9, 10]
+    # The (n + 1)-qubit GHZ state doubles in size and the classical channels grow as n^2 per recipient
+    warm = [("alice", [f"r{i}" for i in range(rc)], None, 0.99) for rc in recipient_counts]
+    results = run_sweep(simulate_recipient_count_qber, recipient_counts, n_trials=512, cost=lambda rc: 2 ** rc * (rc + 1) ** 2, store=store, kwargs={'profile': profile}, warm_networks=warm)
+    _print_profile(results)
+    qbers_per_count = {rc: results[rc]['qbers'] for rc in recipient_counts}
 
     colors = plt.cm.viridis(np.linspace(0, 1, len(recipient_counts)))
 
@@ -242,7 +276,8 @@ def plot_recipient_counts():
 def plot_detection_confidence(recipients=None, fidelities=None, round_counts=None, n_trials=30, confidence_target=0.99):
     import numpy as np
     import matplotlib.pyplot as plt
-    from simulate import run_simulation
+    from result_cache import cached_run_simulation
+    from detection import sequential_eve_test
 
     if recipients is None:
         recipients = ["Bob", "Charlie", "Diana"]
@@ -260,7 +295,7 @@ def plot_detection_confidence(recipients=None, fidelities=None, round_counts=Non
     for fidelity in fidelities:
         baseline_qbers = []
         for i in range(n_trials):
-            stats = run_simulation("Alice", recipients, 200, fidelity=fidelity, verbose=False)
+            stats = cached_run_simulation("Alice", recipients, 200, fidelity=fidelity, results="none", seed=_trial_seed(fidelity, i, "baseline"))
             if stats['valid_rounds'] > 0:
                 baseline_qbers.append(stats['qber'])
 
@@ -276,14 +311,15 @@ def plot_detection_confidence(recipients=None, fidelities=None, round_counts=Non
             clean_false_alarms = 0
             round_eve_qbers = []
 
-            for _ in range(n_trials):
-                stats_eve = run_simulation("Alice", recipients, n_rounds, eve_target=recipients[0], fidelity=fidelity, verbose=False)
+            for i in range(n_trials):
+                stats_eve = cached_run_simulation("Alice", recipients, n_rounds, eve_target=recipients[0], fidelity=fidelity, results="none", seed=_trial_seed(fidelity, n_rounds, i, "eve"))
                 if stats_eve['valid_rounds'] > 0:
                     round_eve_qbers.append(stats_eve['qber'])
                     if stats_eve['qber'] > threshold:
                         eve_detected += 1
 
-                stats_clean = run_simulation("Alice", recipients, n_rounds, fidelity=fidelity, verbose=False)
+                # A seed of its own, so the clean runs never replay the baseline that set the threshold
+                stats_clean = cached_run_simulation("Alice", recipients, n_rounds, fidelity=fidelity, results="none", seed=_trial_seed(fidelity, n_rounds, i, "clean"))
                 if stats_clean['valid_rounds'] > 0 and stats_clean['qber'] > threshold:
                     clean_false_alarms += 1
 
@@ -294,13 +330,21 @@ def plot_detection_confidence(recipients=None, fidelities=None, round_counts=Non
             false_positive_rates.append(false_positive)
             eve_qbers.append(np.mean(round_eve_qbers) if round_eve_qbers else 0)
 
+        error_rate = 1 - confidence_target
+        sprt_eve = [sequential_eve_test("Alice", recipients, baseline_mean / 100, alpha=error_rate, beta=error_rate, eve_target=recipients[0], fidelity=fidelity) for _ in range(n_trials)]
+        sprt_clean = [sequential_eve_test("Alice", recipients, baseline_mean / 100, alpha=error_rate, beta=error_rate, fidelity=fidelity) for _ in range(n_trials)]
+
         results[fidelity] = {
             'threshold': threshold,
             'baseline_mean': baseline_mean,
             'baseline_std': baseline_std,
             'detection_probs': detection_probs,
             'false_positive_rates': false_positive_rates,
-            'eve_qbers': eve_qbers
+            'eve_qbers': eve_qbers,
+            'sprt_eve_rounds': np.mean([r['rounds'] for r in sprt_eve]),
+            'sprt_clean_rounds': np.mean([r['rounds'] for r in sprt_clean]),
+            'sprt_detection_rate': np.mean([r['decision'] == 'eve' for r in sprt_eve]),
+            'sprt_false_alarm_rate': np.mean([r['decision'] == 'eve' for r in sprt_clean])
         }
 
     fig, axes = plt.subplots(1, 2, figsize=(14, 6))
@@ -318,15 +362,36 @@ def plot_detection_confidence(recipients=None, fidelities=None, round_counts=Non
     ax1.legend(loc='lower right')
     ax1.grid(True, alpha=0.3)
 
+    ax2 = axes[1]
+    x = np.arange(len(fidelities))
+    ax2.bar(x - 0.2, [results[f]['sprt_eve_rounds'] for f in fidelities], width=0.4, color='lightcoral', label='Eve present')
+    ax2.bar(x + 0.2, [results[f]['sprt_clean_rounds'] for f in fidelities], width=0.4, color='lightblue', label='Clean')
+    ax2.set_xticks(x, [f"{f*100:.1f}%" for f in fidelities])
+    ax2.set_xlabel('Link Fidelity', fontsize=12)
+    ax2.set_ylabel('Mean Rounds to Decision', fontsize=12)
+    ax2.set_title('Sequential Test (SPRT) Rounds to Decision', fontsize=14)
+    ax2.legend()
+    ax2.grid(axis='y', alpha=0.3)
+
     plt.tight_layout()
     plt.show()
+
+    print("SPRT detection:")
+    for fidelity in fidelities:
+        r = results[fidelity]
+        print(f"Fidelity {fidelity*100:.1f}%")
+        print(f"\tMean rounds to decision: Eve {r['sprt_eve_rounds']:.1f}, clean {r['sprt_clean_rounds']:.1f}")
+        print(f"\tDetection rate: {r['sprt_detection_rate'] * 100:.1f}%")
+        print(f"\tFalse alarm rate: {r['sprt_false_alarm_rate'] * 100:.1f}%")
     return results
 
 if __name__ == "__main__":
     #basic()
+    #key_reconciliation()
     #vary_recipients()
     #plot_fidelities()
-    #plot_eve_impact_fidelity(recipients=["Bob", "Charlie", "Diana"], n_trials=256)
+    # Pass store="sweeps/<name>" to checkpoint trials and re-plot a finished sweep without resimulating
+    #plot_eve_impact_fidelity(recipients=["Bob", "Charlie", "Diana"], n_trials=256, store="sweeps/eve_impact")
     plot_recipient_counts()
     #plot_detection_confidence(
     #     recipients=5,
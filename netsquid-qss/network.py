@@ -1,17 +1,73 @@
+from collections import OrderedDict
 from netsquid.nodes import Node
 from netsquid.components import QuantumMemory, QuantumChannel, ClassicalChannel
 from netsquid.components.models.qerrormodels import DepolarNoiseModel
 from netsquid.components.models.delaymodels import FixedDelayModel
+from formalism import set_formalism
+
+NETWORK_CACHE_SIZE = 8
+_network_cache = OrderedDict()
+
+def depolar_probability(fidelity: float) -> float:
+    if fidelity >= 1.0:
+        return 0.0
+    return 4 * (1 - fidelity) / 3
+
+def depolar_noise_model(fidelity: float):
+    if fidelity >= 1.0:
+        return None
+    return DepolarNoiseModel(depolar_rate=depolar_probability(fidelity), time_independent=True)
 
 def create_noisy_channel(name: str, length: float, fidelity: float):
     delay_model = FixedDelayModel(delay=length * 5)
-    if fidelity >= 1.0:
+    noise_model = depolar_noise_model(fidelity)
+    if noise_model is None:
         return QuantumChannel(name, length=length, models={"delay_model": delay_model})
-    depolar_rate = 4 * (1 - fidelity) / 3
-    noise_model = DepolarNoiseModel(depolar_rate=depolar_rate, time_independent=True)
     return QuantumChannel(name, length=length, models={"quantum_noise_model": noise_model, "delay_model": delay_model})
 
-def create_network(dealer_name: str, recipient_names: list, eve_target: str = None, fidelity: float = 1.0):
+def set_channel_fidelity(channel, fidelity: float):
+    noise_model = depolar_noise_model(fidelity)
+    if noise_model is not None:
+        channel.models["quantum_noise_model"] = noise_model
+    elif "quantum_noise_model" in channel.models:
+        # A noiseless channel has no noise model at all, as create_noisy_channel builds it
+        del channel.models["quantum_noise_model"]
+
+def reserve_network_cache(n_networks: int):
+    # Grow the cache so that n_networks pre-built networks all stay cached
+    global NETWORK_CACHE_SIZE
+    NETWORK_CACHE_SIZE = max(NETWORK_CACHE_SIZE, n_networks)
+
+def create_network(dealer_name: str, recipient_names: list, eve_target: str = None, fidelity: float = 1.0, cache: bool = False, formalism: str = None):
+    if formalism is not None:
+        set_formalism(formalism)
+    if cache:
+        return _get_cached_network(dealer_name, recipient_names, eve_target, fidelity)
+    nodes, eve_node, _ = _build_network(dealer_name, recipient_names, eve_target, fidelity)
+    return nodes, eve_node
+
+def _get_cached_network(dealer_name, recipient_names, eve_target, fidelity):
+    key = (dealer_name, tuple(recipient_names), eve_target)
+    entry = _network_cache.get(key)
+    if entry is None:
+        entry = list(_build_network(dealer_name, recipient_names, eve_target, fidelity)) + [fidelity]
+        _network_cache[key] = entry
+        while len(_network_cache) > NETWORK_CACHE_SIZE:
+            _network_cache.popitem(last=False)
+    else:
+        _network_cache.move_to_end(key)
+
+    nodes, eve_node, noisy_channels, cached_fidelity = entry
+    if fidelity != cached_fidelity:
+        for channel in noisy_channels:
+            set_channel_fidelity(channel, fidelity)
+        entry[3] = fidelity
+    return nodes, eve_node
+
+def clear_network_cache():
+    _network_cache.clear()
+
+def _build_network(dealer_name, recipient_names, eve_target, fidelity):
     nodes = {}
 
     dealer = Node(dealer_name)
@@ -32,8 +88,8 @@ def create_network(dealer_name: str, recipient_names: list, eve_target: str = No
         eve_node.add_subcomponent(eve_mem, name="memory")
 
     _setup_ports(nodes, dealer_name, recipient_names, eve_node, eve_target)
-    _setup_channels(nodes, dealer_name, recipient_names, eve_node, eve_target, fidelity)
-    return nodes, eve_node
+    noisy_channels = _setup_channels(nodes, dealer_name, recipient_names, eve_node, eve_target, fidelity)
+    return nodes, eve_node, noisy_channels
 
 
 def _setup_ports(nodes, dealer_name, recipient_names, eve_node, eve_target):
@@ -72,12 +128,14 @@ def _setup_ports(nodes, dealer_name, recipient_names, eve_node, eve_target):
 
 def _setup_channels(nodes, dealer_name, recipient_names, eve_node, eve_target, fidelity):
     dealer = nodes[dealer_name]
+    noisy_channels = []
 
     for recipient in recipient_names:
         recipient_node = nodes[recipient]
 
         if eve_target == recipient and eve_node:
             qc_to_eve = create_noisy_channel(f"QC_{dealer_name}_Eve", 5, fidelity)
+            noisy_channels.append(qc_to_eve)
             qc_to_eve.ports["send"].connect(dealer.ports["q_port_toEve"])
             qc_to_eve.ports["recv"].connect(eve_node.ports[f"q_port_from{dealer_name}"])
 
@@ -86,6 +144,7 @@ def _setup_channels(nodes, dealer_name, recipient_names, eve_node, eve_target, f
             qc_from_eve.ports["recv"].connect(recipient_node.ports["q_port_fromEve"])
         else:
             qc = create_noisy_channel(f"QC_{dealer_name}_{recipient}", 10, fidelity)
+            noisy_channels.append(qc)
             qc.ports["send"].connect(dealer.ports[f"q_port_to{recipient}"])
             qc.ports["recv"].connect(recipient_node.ports[f"q_port_from{dealer_name}"])
 
@@ -109,6 +168,8 @@ def _setup_channels(nodes, dealer_name, recipient_names, eve_node, eve_target, f
             cc_2to1.ports["send"].connect(node2.ports[f"c_port_to{r1}"])
             cc_2to1.ports["recv"].connect(node1.ports[f"c_port_from{r2}"])
 
+    return noisy_channels
+
 def reset_network(nodes, eve_node=None):
     for node in nodes.values():
         node.subcomponents["memory"].reset()
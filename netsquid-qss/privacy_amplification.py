@@ -0,0 +1,41 @@
+import math
+from typing import Optional
+
+import numpy as np
+from scipy import fft
+
+def binary_entropy(p: float) -> float:
+    if p <= 0 or p >= 1:
+        return 0.0
+    return -p * math.log2(p) - (1 - p) * math.log2(1 - p)
+
+def output_length(n_bits: int, qber: float, leaked_bits: Optional[int] = None, epsilon: float = 1e-10, ec_efficiency: float = 1.2) -> int:
+    # Asymptotic key length n(1 - h(Q)) minus what reconciliation disclosed and the finite-key
+    # security margin 2 log2(1/epsilon). qber is a fraction: divide run_simulation's percentage by 100.
+    # Without a measured leak the reconciliation cost is estimated as ec_efficiency * n * h(Q).
+    if leaked_bits is None:
+        leaked_bits = math.ceil(ec_efficiency * n_bits * binary_entropy(qber))
+    length = n_bits * (1 - binary_entropy(qber)) - leaked_bits - 2 * math.log2(1 / epsilon)
+    return max(0, math.floor(length))
+
+def toeplitz_seed(n_bits: int, out_bits: int, seed: Optional[int] = None) -> np.ndarray:
+    return np.random.default_rng(seed).integers(0, 2, size=n_bits + out_bits - 1, dtype=np.uint8)
+
+def toeplitz_hash(key: np.ndarray, toeplitz: np.ndarray, out_bits: int) -> np.ndarray:
+    # T[i, j] = toeplitz[i - j + n - 1], so T @ key is entry n - 1 + i of the full convolution of
+    # toeplitz and key, computed with a real FFT in O((n + m) log(n + m)) instead of O(nm)
+    key = np.asarray(key, dtype=np.float64)
+    n_bits = len(key)
+    if out_bits == 0 or n_bits == 0:
+        return np.zeros(out_bits, dtype=np.uint8)
+    if len(toeplitz) != n_bits + out_bits - 1:
+        raise ValueError(f"Toeplitz seed needs {n_bits + out_bits - 1} bits, got {len(toeplitz)}")
+
+    size = fft.next_fast_len(len(toeplitz) + n_bits - 1, real=True)
+    spectrum = fft.rfft(np.asarray(toeplitz, dtype=np.float64), size, workers=-1) * fft.rfft(key, size, workers=-1)
+    convolution = fft.irfft(spectrum, size, workers=-1)[n_bits - 1:n_bits - 1 + out_bits]
+    return (np.rint(convolution).astype(np.int64) & 1).astype(np.uint8)
+
+def amplify(key: np.ndarray, qber: float, leaked_bits: Optional[int] = None, epsilon: float = 1e-10, seed: Optional[int] = None) -> np.ndarray:
+    out_bits = output_length(len(key), qber, leaked_bits, epsilon)
+    return toeplitz_hash(key, toeplitz_seed(len(key), out_bits, seed), out_bits)
@@ -1,73 +1,109 @@
 import random
 import netsquid as ns
 from netsquid.protocols import Protocol
+from netsquid.protocols.protocol import Signals
+
+def receive_message(protocol, port):
+    # The dealer measures (and sends its basis) as soon as its qubit is in memory, which can be
+    # before a recipient's qubit has arrived. await_port_input only fires on new input, so the
+    # messages already queued on the port are read first
+    msg = port.rx_input()
+    while msg is None:
+        yield protocol.await_port_input(port)
+        msg = port.rx_input()
+    return msg
 
 class PartyProtocol(Protocol):
-    def __init__(self, node, party_name: str, other_parties: list):
+    def __init__(self, node, party_name: str, other_parties: list, n_rounds: int = 1):
         super().__init__(name=f"Protocol_{party_name}")
         self.node = node
         self.party_name = party_name
         self.other_parties = other_parties
+        self.n_rounds = n_rounds
         self.memory = node.subcomponents["memory"]
         self.basis = None
         self.outcome = None
         self.received_bases = {}
+        self.history = []
 
     def run(self):
-        while len(self.memory.used_positions) < 1:
-            yield self.await_timer(1)
+        for _ in range(self.n_rounds):
+            self.received_bases = {}
+            if 0 not in self.memory.used_positions:
+                yield self.await_mempositions_in_use(self.memory, [0])
+
+            self.basis = random.choice(["X", "Y"])
+            observable = ns.X if self.basis == "X" else ns.Y
 
-        self.basis = random.choice(["X", "Y"])
-        observable = ns.X if self.basis == "X" else ns.Y
+            # Discard so the next round's qubit is not mistaken for this one
+            self.outcome, _ = self.memory.measure([0], observable, discard=True)
 
-        self.outcome, _ = self.memory.measure([0], observable)
+            for other in self.other_parties:
+                port_name = f"c_port_to{other}"
+                if port_name in self.node.ports:
+                    self.node.ports[port_name].tx_output((self.party_name, self.basis))
 
-        for other in self.other_parties:
-            port_name = f"c_port_to{other}"
-            if port_name in self.node.ports:
-                self.node.ports[port_name].tx_output((self.party_name, self.basis))
+            for other in self.other_parties:
+                port_name = f"c_port_from{other}"
+                if port_name in self.node.ports:
+                    msg = yield from receive_message(self, self.node.ports[port_name])
+                    if msg.items:
+                        sender, basis = msg.items[0]
+                        self.received_bases[sender] = basis
 
-        for other in self.other_parties:
-            port_name = f"c_port_from{other}"
-            if port_name in self.node.ports:
-                port = self.node.ports[port_name]
-                yield self.await_port_input(port)
-                msg = port.rx_input()
-                if msg and msg.items:
-                    sender, basis = msg.items[0]
-                    self.received_bases[sender] = basis
+            self.history.append((self.basis, self.outcome))
 
 class DealerProtocol(Protocol):
-    def __init__(self, node, dealer_name: str, recipient_names: list):
+    def __init__(self, node, dealer_name: str, recipient_names: list, n_rounds: int = 1):
         super().__init__(name=f"Protocol_{dealer_name}")
         self.node = node
         self.dealer_name = dealer_name
         self.recipient_names = recipient_names
+        self.n_rounds = n_rounds
         self.memory = node.subcomponents["memory"]
         self.basis = None
         self.outcome = None
         self.received_bases = {}
+        self.history = []
+
+    def run(self):
+        for _ in range(self.n_rounds):
+            self.received_bases = {}
+            if 0 not in self.memory.used_positions:
+                yield self.await_mempositions_in_use(self.memory, [0])
+
+            self.basis = random.choice(["X", "Y"])
+            observable = ns.X if self.basis == "X" else ns.Y
+
+            self.outcome, _ = self.memory.measure([0], observable, discard=True)
+
+            for recipient in self.recipient_names:
+                port_name = f"c_port_to{recipient}"
+                if port_name in self.node.ports:
+                    self.node.ports[port_name].tx_output((self.dealer_name, self.basis))
+
+            for recipient in self.recipient_names:
+                port_name = f"c_port_from{recipient}"
+                if port_name in self.node.ports:
+                    msg = yield from receive_message(self, self.node.ports[port_name])
+                    if msg.items:
+                        sender, basis = msg.items[0]
+                        self.received_bases[sender] = basis
+
+            self.history.append((self.basis, self.outcome))
+            # Every recipient has measured once its basis arrived, so the source may send the next GHZ state
+            self.send_signal(Signals.SUCCESS)
+
+class CompletionProtocol(Protocol):
+    def __init__(self, protocols: list):
+        super().__init__(name="Completion")
+        self.protocols = protocols
+        self.done = False
 
     def run(self):
-        while 0 not in self.memory.used_positions:
-            yield self.await_timer(1)
-
-        self.basis = random.choice(["X", "Y"])
-        observable = ns.X if self.basis == "X" else ns.Y
-
-        self.outcome, _ = self.memory.measure([0], observable)
-
-        for recipient in self.recipient_names:
-            port_name = f"c_port_to{recipient}"
-            if port_name in self.node.ports:
-                self.node.ports[port_name].tx_output((self.dealer_name, self.basis))
-
-        for recipient in self.recipient_names:
-            port_name = f"c_port_from{recipient}"
-            if port_name in self.node.ports:
-                port = self.node.ports[port_name]
-                yield self.await_port_input(port)
-                msg = port.rx_input()
-                if msg and msg.items:
-                    sender, basis = msg.items[0]
-                    self.received_bases[sender] = basis
\ No newline at end of file
+        expression = self.await_signal(self.protocols[0], Signals.FINISHED)
+        for protocol in self.protocols[1:]:
+            expression &= self.await_signal(protocol, Signals.FINISHED)
+        yield expression
+        self.done = True
+        ns.sim_stop()
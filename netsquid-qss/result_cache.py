@@ -0,0 +1,102 @@
+import hashlib
+import json
+import os
+import pickle
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, List
+
+from simulate import run_simulation
+
+CACHE_DIR = Path(os.environ.get("QSS_RESULT_CACHE", Path.home() / ".cache" / "qss-results"))
+CACHE_MAX_BYTES = 512 * 1024 * 1024
+# Eviction goes below the cap, so a full cache is not scanned again on the very next write
+CACHE_EVICT_TO_BYTES = CACHE_MAX_BYTES * 3 // 4
+
+# Every module whose code can change a simulation result invalidates the cache when edited
+SOURCE_FILES = ("simulate.py", "protocols.py", "ghz_resource.py", "eve.py", "network.py", "sampler.py", "validation.py", "columnar.py", "formalism.py")
+
+@lru_cache(maxsize=None)
+def source_hash() -> str:
+    digest = hashlib.sha256()
+    source_dir = Path(__file__).parent
+    for name in SOURCE_FILES:
+        digest.update(name.encode())
+        digest.update((source_dir / name).read_bytes())
+    return digest.hexdigest()
+
+def cache_key(params: Dict) -> str:
+    payload = json.dumps({"params": params, "source": source_hash()}, sort_keys=True)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+def cached_run_simulation(dealer_name: str, recipient_names: List[str], n_rounds: int, eve_target: str = None, fidelity: float = 1.0, seed: int = None, **kwargs) -> Dict:
+    # Unseeded runs are not reproducible and profiles must be measured afresh
+    if seed is None or kwargs.get("profile"):
+        return run_simulation(dealer_name, recipient_names, n_rounds, eve_target=eve_target, fidelity=fidelity, seed=seed, **kwargs)
+
+    kwargs.pop("verbose", None)
+    params = {"dealer_name": dealer_name, "recipient_names": list(recipient_names), "n_rounds": n_rounds, "eve_target": eve_target, "fidelity": fidelity, "seed": seed, **kwargs}
+    path = CACHE_DIR / f"{cache_key(params)}.pkl"
+
+    try:
+        with open(path, "rb") as f:
+            stats = pickle.load(f)
+        os.utime(path)
+        return stats
+    except (FileNotFoundError, EOFError, pickle.UnpicklingError):
+        pass
+
+    stats = run_simulation(dealer_name, recipient_names, n_rounds, eve_target=eve_target, fidelity=fidelity, seed=seed, **kwargs)
+
+    CACHE_DIR.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_suffix(f".{os.getpid()}.tmp")
+    with open(tmp_path, "wb") as f:
+        pickle.dump(stats, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_path, path)
+    _add_cache_bytes(path.stat().st_size)
+    return stats
+
+# Size of the cache directory as this process last saw it; None until its first write scans it
+_cache_bytes = None
+
+def _add_cache_bytes(size: int):
+    # A running total instead of a directory scan per write. It only counts this process's own
+    # writes, so entries added by other processes (sweep workers) are picked up by the scan in
+    # evict once the total passes the cap
+    global _cache_bytes
+    if _cache_bytes is None:
+        _cache_bytes = sum(size for _, size, _ in _cache_entries())
+    else:
+        _cache_bytes += size
+    if _cache_bytes > CACHE_MAX_BYTES:
+        _cache_bytes = evict(CACHE_EVICT_TO_BYTES)
+
+def _cache_entries():
+    entries = []
+    for path in CACHE_DIR.glob("*.pkl"):
+        try:
+            stat = path.stat()
+        except FileNotFoundError:
+            continue
+        entries.append((stat.st_mtime, stat.st_size, path))
+    return entries
+
+def evict(max_bytes: int = CACHE_MAX_BYTES) -> int:
+    # Least recently used entries go first; hits refresh the modification time. Returns the bytes left
+    entries = _cache_entries()
+    total = sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries, key=lambda entry: entry[0]):
+        if total <= max_bytes:
+            break
+        try:
+            path.unlink()
+        except FileNotFoundError:
+            pass
+        total -= size
+    return total
+
+def clear_cache():
+    global _cache_bytes
+    for path in CACHE_DIR.glob("*.pkl"):
+        path.unlink(missing_ok=True)
+    _cache_bytes = 0
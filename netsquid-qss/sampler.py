@@ -0,0 +1,46 @@
+import numpy as np
+
+# Basis codes used in the sampled arrays, matching the 0 = X, 1 = Y convention of qne-qss
+BASES = ("X", "Y")
+
+def flip_probability(fidelity: float) -> float:
+    # DepolarNoiseModel replaces the qubit by I/2 with probability 4(1-F)/3, i.e. X, Y and Z
+    # each with probability (1-F)/3. Two of the three anticommute with an X or Y measurement.
+    if fidelity >= 1.0:
+        return 0.0
+    return 2 * (4 * (1 - fidelity) / 3) / 4
+
+# Returns (n_rounds, 1 + n_recipients) int8 basis and outcome arrays, column 0 being the dealer.
+# Ideal GHZ statistics are drawn directly: outcomes are uniform, except that rounds with an even
+# number of Y bases have outcome parity (#Y / 2) mod 2. Channel depolarization is tracked as a
+# Pauli frame, flipping a recipient outcome when the error anticommutes with its basis.
+def sample_rounds(n_recipients: int, n_rounds: int, fidelity: float = 1.0, eve_index: int = None, rng=None):
+    rng = np.random.default_rng() if rng is None else rng
+    n_parties = 1 + n_recipients
+
+    bases = rng.integers(0, 2, size=(n_rounds, n_parties), dtype=np.int8)
+    measured_bases = bases
+    if eve_index is not None:
+        eve_bases = rng.integers(0, 2, size=n_rounds, dtype=np.int8)
+        measured_bases = bases.copy()
+        measured_bases[:, eve_index] = eve_bases
+
+    y_count = measured_bases.sum(axis=1, dtype=np.int64)
+    outcomes = rng.integers(0, 2, size=(n_rounds, n_parties), dtype=np.int8)
+    even = (y_count % 2) == 0
+    expected_parity = ((y_count // 2) % 2).astype(np.int8)
+    head_parity = np.bitwise_xor.reduce(outcomes[:, :-1], axis=1)
+    outcomes[even, -1] = (head_parity ^ expected_parity)[even]
+
+    p_flip = flip_probability(fidelity)
+    if p_flip > 0:
+        outcomes[:, 1:] ^= (rng.random((n_rounds, n_recipients)) < p_flip).astype(np.int8)
+
+    if eve_index is not None:
+        # Eve resends an eigenstate of her basis: the target reproduces her outcome in the same
+        # basis and gets a uniformly random outcome in the other one
+        same_basis = bases[:, eve_index] == eve_bases
+        random_outcomes = rng.integers(0, 2, size=n_rounds, dtype=np.int8)
+        outcomes[:, eve_index] = np.where(same_basis, outcomes[:, eve_index], random_outcomes)
+
+    return bases, outcomes
@@ -1,43 +1,36 @@
+import random
 import netsquid as ns
-from typing import Dict, List
+import numpy as np
+from math import sqrt
+from statistics import NormalDist
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
 from network import create_network, reset_network
-from ghz_resource import distribute_ghz_state, distribute_ghz_with_eve
-from protocols import DealerProtocol, PartyProtocol
+from ghz_resource import distribute_ghz_state, distribute_ghz_with_eve, distribute_ghz_direct, QubitReceiverProtocol, GHZSourceProtocol
+from protocols import DealerProtocol, PartyProtocol, CompletionProtocol
 from eve import EveInterceptProtocol
-from validation import is_valid_round, check_ghz_parity, verify_secret_sharing
+from validation import is_valid_round, check_ghz_parity, verify_secret_sharing, are_valid_rounds, check_ghz_parities, verify_secret_sharing_batch, results_to_arrays
+from sampler import sample_rounds
+from columnar import RESULT_FORMATS, to_columnar, to_dicts
+from instrumentation import new_profile, phase, record_sim_run, record_qstate
 
-def run_single_round(nodes: Dict, dealer_name: str, recipient_names: List[str], eve_node=None, eve_target: str = None) -> Dict:
-    reset_network(nodes, eve_node)
-    ns.sim_reset()
+# Simulated-time budget per round before the watchdog gives up on the protocols
+ROUND_TIMEOUT = 1e6
 
-    if eve_node and eve_target:
-        eve_protocol, _ = distribute_ghz_with_eve(nodes, dealer_name, recipient_names, eve_node, eve_target, EveInterceptProtocol)
-    else:
-        distribute_ghz_state(nodes, dealer_name, recipient_names)
-
-    all_parties = [dealer_name] + recipient_names
-
-    dealer_protocol = DealerProtocol(nodes[dealer_name], dealer_name, recipient_names)
+class RoundTimeoutError(RuntimeError):
+    pass
 
-    recipient_protocols = {}
-    for recipient in recipient_names:
-        other_parties = [p for p in all_parties if p != recipient]
-        protocol = PartyProtocol(nodes[recipient], recipient, other_parties)
-        recipient_protocols[recipient] = protocol
-
-    dealer_protocol.start()
-    for protocol in recipient_protocols.values():
+def run_until_finished(protocols: List, timeout: float):
+    completion = CompletionProtocol(protocols)
+    completion.start()
+    for protocol in protocols:
         protocol.start()
 
-    ns.sim_run(duration=1000)
-
-    bases = {dealer_name: dealer_protocol.basis}
-    outcomes = {dealer_name: dealer_protocol.outcome}
-
-    for recipient, protocol in recipient_protocols.items():
-        bases[recipient] = protocol.basis
-        outcomes[recipient] = protocol.outcome
+    ns.sim_run(duration=timeout)
+    if not completion.done:
+        names = ", ".join(protocol.name for protocol in protocols)
+        raise RoundTimeoutError(f"Protocols did not finish within {timeout} ns: {names}")
 
+def _round_result(bases: Dict, outcomes: Dict, dealer_name: str) -> Dict:
     valid = is_valid_round(bases)
     parity_passed = check_ghz_parity(bases, outcomes) if valid else None
     ss_success, ss_reconstructed, ss_actual = verify_secret_sharing(bases, outcomes, dealer_name) if valid else (None, None, None)
@@ -52,26 +45,151 @@ def run_single_round(nodes: Dict, dealer_name: str, recipient_names: List[str],
         "actual": ss_actual,
     }
 
+def _single_round_history(nodes: Dict, dealer_name: str, recipient_names: List[str], eve_node=None, eve_target: str = None, profile: Optional[Dict] = None, compiled_fidelity: Optional[float] = None) -> List[Tuple]:
+    # (basis, outcome) of every party, dealer first
+    with phase(profile, "reset"):
+        reset_network(nodes, eve_node)
+        ns.sim_reset()
+
+    with phase(profile, "distribution"):
+        if compiled_fidelity is not None:
+            eve_protocol = EveInterceptProtocol(eve_node, eve_target, dealer_name=dealer_name) if eve_node and eve_target else None
+            distribute_ghz_direct(nodes, dealer_name, recipient_names, compiled_fidelity, eve_protocol, eve_target)
+        elif eve_node and eve_target:
+            eve_protocol, _ = distribute_ghz_with_eve(nodes, dealer_name, recipient_names, eve_node, eve_target, EveInterceptProtocol)
+        else:
+            distribute_ghz_state(nodes, dealer_name, recipient_names)
+    if profile is not None:
+        record_qstate(profile, nodes[dealer_name].subcomponents["memory"].peek([0])[0])
+
+    all_parties = [dealer_name] + recipient_names
+
+    dealer_protocol = DealerProtocol(nodes[dealer_name], dealer_name, recipient_names)
+
+    recipient_protocols = {}
+    for recipient in recipient_names:
+        other_parties = [p for p in all_parties if p != recipient]
+        protocol = PartyProtocol(nodes[recipient], recipient, other_parties)
+        recipient_protocols[recipient] = protocol
+
+    with phase(profile, "protocols"):
+        run_until_finished([dealer_protocol, *recipient_protocols.values()], ROUND_TIMEOUT)
+    record_sim_run(profile, "protocols", ns.sim_stats(), ns.sim_time())
+
+    return [(protocol.basis, protocol.outcome) for protocol in [dealer_protocol, *recipient_protocols.values()]]
 
-def run_simulation(dealer_name: str, recipient_names: List[str], n_rounds: int, eve_target: str = None, verbose: bool = False, fidelity: float = 1.0) -> Dict:
-    nodes, eve_node = create_network(dealer_name, recipient_names, eve_target, fidelity)
 
-    valid_rounds = 0
-    passed_rounds = 0
-    ss_successes = 0
+def run_single_round(nodes: Dict, dealer_name: str, recipient_names: List[str], eve_node=None, eve_target: str = None, profile: Optional[Dict] = None, compiled_fidelity: Optional[float] = None) -> Dict:
+    history = _single_round_history(nodes, dealer_name, recipient_names, eve_node, eve_target, profile, compiled_fidelity)
+
+    bases, outcomes = {}, {}
+    for name, (basis, outcome) in zip([dealer_name] + recipient_names, history):
+        bases[name] = basis
+        outcomes[name] = outcome
+
+    with phase(profile, "validation"):
+        return _round_result(bases, outcomes, dealer_name)
+
+
+def _multi_round_histories(nodes: Dict, dealer_name: str, recipient_names: List[str], n_rounds: int, eve_node=None, eve_target: str = None, profile: Optional[Dict] = None, compiled_fidelity: Optional[float] = None) -> List[List[Tuple]]:
+    # Per party, dealer first, the (basis, outcome) of every round
+    with phase(profile, "reset"):
+        reset_network(nodes, eve_node)
+        ns.sim_reset()
+
+    all_parties = [dealer_name] + recipient_names
+    eve_target = eve_target if eve_node else None
+
+    dealer_protocol = DealerProtocol(nodes[dealer_name], dealer_name, recipient_names, n_rounds=n_rounds)
+
+    recipient_protocols = {}
+    receivers = []
+    for recipient in recipient_names:
+        other_parties = [p for p in all_parties if p != recipient]
+        recipient_protocols[recipient] = PartyProtocol(nodes[recipient], recipient, other_parties, n_rounds=n_rounds)
+        port_name = "q_port_fromEve" if recipient == eve_target else f"q_port_from{dealer_name}"
+        receivers.append(QubitReceiverProtocol(nodes[recipient], port_name, n_rounds=n_rounds))
+
+    eve_protocol = EveInterceptProtocol(eve_node, eve_target, n_rounds=n_rounds, dealer_name=dealer_name) if eve_target else None
+    if compiled_fidelity is None:
+        # With compiled noise the source stores qubits directly, so nothing listens on the channels
+        for protocol in receivers + ([eve_protocol] if eve_protocol else []):
+            protocol.start()
+
+    source = GHZSourceProtocol(nodes, dealer_name, recipient_names, dealer_protocol, n_rounds, eve_target, compiled_fidelity, eve_protocol, profile)
+    # GHZ distribution happens inside the simulation here, so it is part of the protocols phase
+    with phase(profile, "protocols"):
+        run_until_finished([dealer_protocol, *recipient_protocols.values(), source], n_rounds * ROUND_TIMEOUT)
+    record_sim_run(profile, "protocols", ns.sim_stats(), ns.sim_time())
+
+    return [protocol.history for protocol in [dealer_protocol, *recipient_protocols.values()]]
+
+
+def run_multi_round(nodes: Dict, dealer_name: str, recipient_names: List[str], n_rounds: int, eve_node=None, eve_target: str = None, profile: Optional[Dict] = None, compiled_fidelity: Optional[float] = None) -> List[Dict]:
+    histories = _multi_round_histories(nodes, dealer_name, recipient_names, n_rounds, eve_node, eve_target, profile, compiled_fidelity)
+    party_names = [dealer_name] + recipient_names
 
     results_list = []
-    for i in range(n_rounds):
-        result = run_single_round(nodes, dealer_name, recipient_names, eve_node, eve_target)
-        results_list.append(result)
+    with phase(profile, "validation"):
+        for i in range(n_rounds):
+            bases, outcomes = {}, {}
+            for name, history in zip(party_names, histories):
+                bases[name], outcomes[name] = history[i]
+            results_list.append(_round_result(bases, outcomes, dealer_name))
+
+    return results_list
 
-        if result["valid"]:
-            valid_rounds += 1
-            if result["parity_passed"]:
-                passed_rounds += 1
-            if result["secret_sharing_success"]:
-                ss_successes += 1
 
+def _histories_to_arrays(histories: List[List[Tuple]], n_rounds: int) -> Tuple[np.ndarray, np.ndarray]:
+    # Same (n_rounds, n_parties) int8 layout as results_to_arrays, without building round dicts
+    bases = np.zeros((n_rounds, len(histories)), dtype=np.int8)
+    outcomes = np.zeros_like(bases)
+    for j, history in enumerate(histories):
+        for i, (basis, outcome) in enumerate(history):
+            bases[i, j] = basis == "Y"
+            outcomes[i, j] = outcome[0] if isinstance(outcome, (list, tuple)) else outcome
+    return bases, outcomes
+
+
+def _seed(seed: Optional[int]):
+    if seed is None:
+        return None
+    random.seed(seed)
+    ns.set_random_state(seed=seed)
+    return np.random.default_rng(seed)
+
+
+def _run_rounds(dealer_name: str, recipient_names: List[str], n_rounds: int, eve_target: str, fidelity: float, multi_round: bool, engine: str, rng=None, profile: Optional[Dict] = None, formalism: str = "ket", compiled_noise: bool = False, round_dicts: bool = True):
+    party_names = [dealer_name] + recipient_names
+    if engine == "sampler":
+        eve_index = party_names.index(eve_target) if eve_target in recipient_names else None
+        with phase(profile, "sampling"):
+            bases, outcomes = sample_rounds(len(recipient_names), n_rounds, fidelity, eve_index, rng)
+        return None, bases, outcomes
+    elif engine == "netsquid":
+        with phase(profile, "network"):
+            nodes, eve_node = create_network(dealer_name, recipient_names, eve_target, fidelity, cache=True, formalism=formalism)
+        compiled_fidelity = fidelity if compiled_noise else None
+        if not round_dicts:
+            if multi_round:
+                histories = _multi_round_histories(nodes, dealer_name, recipient_names, n_rounds, eve_node, eve_target, profile, compiled_fidelity)
+            else:
+                rounds = [_single_round_history(nodes, dealer_name, recipient_names, eve_node, eve_target, profile, compiled_fidelity) for _ in range(n_rounds)]
+                histories = list(zip(*rounds)) if rounds else [[] for _ in party_names]
+            with phase(profile, "validation"):
+                bases, outcomes = _histories_to_arrays(histories, n_rounds)
+            return None, bases, outcomes
+        if multi_round:
+            results_list = run_multi_round(nodes, dealer_name, recipient_names, n_rounds, eve_node, eve_target, profile, compiled_fidelity)
+        else:
+            results_list = [run_single_round(nodes, dealer_name, recipient_names, eve_node, eve_target, profile, compiled_fidelity) for _ in range(n_rounds)]
+        bases, outcomes = results_to_arrays(results_list, party_names)
+        return results_list, bases, outcomes
+    else:
+        raise ValueError(f"Unknown engine: {engine}")
+
+
+def _summary(n_rounds: int, valid_rounds: int, passed_rounds: int, ss_successes: int, eve_target: str) -> Dict:
     error_rounds = valid_rounds - passed_rounds
     qber = (error_rounds / valid_rounds * 100) if valid_rounds > 0 else 0
     ss_rate = (ss_successes / valid_rounds * 100) if valid_rounds > 0 else 0
@@ -85,5 +203,77 @@ def run_simulation(dealer_name: str, recipient_names: List[str], n_rounds: int,
         "ss_rate": ss_rate,
         "eve_present": eve_target is not None,
         "eve_target": eve_target,
-        "results": results_list,
-    }
\ No newline at end of file
+    }
+
+
+def wilson_interval(successes: int, trials: int, confidence: float = 0.95) -> Tuple[float, float]:
+    if trials == 0:
+        return 0.0, 1.0
+    z = NormalDist().inv_cdf((1 + confidence) / 2)
+    p = successes / trials
+    denominator = 1 + z ** 2 / trials
+    centre = (p + z ** 2 / (2 * trials)) / denominator
+    margin = z * sqrt(p * (1 - p) / trials + z ** 2 / (4 * trials ** 2)) / denominator
+    return max(0.0, centre - margin), min(1.0, centre + margin)
+
+
+def run_simulation(dealer_name: str, recipient_names: List[str], n_rounds: int, eve_target: str = None, verbose: bool = False, fidelity: float = 1.0, multi_round: bool = False, engine: str = "netsquid", results: str = "dicts", seed: Optional[int] = None, profile: bool = False, formalism: str = "ket", compiled_noise: bool = False) -> Dict:
+    if results not in RESULT_FORMATS:
+        raise ValueError(f"Unknown results format: {results}")
+
+    party_names = [dealer_name] + recipient_names
+    rng = _seed(seed)
+    run_profile = new_profile() if profile else None
+    results_list, bases, outcomes = _run_rounds(dealer_name, recipient_names, n_rounds, eve_target, fidelity, multi_round, engine, rng, run_profile, formalism, compiled_noise, round_dicts=results == "dicts")
+
+    with phase(run_profile, "statistics"):
+        valid = are_valid_rounds(bases)
+        parity_passed = check_ghz_parities(bases, outcomes)
+        ss_success, reconstructed, actual = verify_secret_sharing_batch(bases, outcomes)
+
+    if results == "dicts":
+        if results_list is None:
+            results_list = to_dicts(party_names, bases, outcomes, valid, parity_passed, ss_success, reconstructed, actual)
+        round_results = results_list
+    elif results == "columnar":
+        round_results = to_columnar(party_names, bases, outcomes, valid, parity_passed, ss_success)
+    else:
+        round_results = None
+
+    stats = _summary(n_rounds, int(valid.sum()), int(parity_passed.sum()), int(ss_success.sum()), eve_target)
+    stats["results"] = round_results
+    if run_profile is not None:
+        stats["profile"] = run_profile
+    return stats
+
+
+def iter_simulation(dealer_name: str, recipient_names: List[str], n_rounds: Optional[int] = None, eve_target: str = None, fidelity: float = 1.0, batch_size: int = 1, engine: str = "netsquid", confidence: float = 0.95, should_stop: Optional[Callable[[], bool]] = None, seed: Optional[int] = None, formalism: str = "ket", compiled_noise: bool = False) -> Iterator[Dict]:
+    # Yields running statistics after every batch of rounds, together with the batch's round dicts.
+    # Runs until n_rounds (forever if None), until should_stop() returns True, or until closed.
+    party_names = [dealer_name] + recipient_names
+    rounds_done = valid_rounds = passed_rounds = ss_successes = 0
+    rng = _seed(seed)
+
+    while n_rounds is None or rounds_done < n_rounds:
+        if should_stop is not None and should_stop():
+            return
+
+        size = batch_size if n_rounds is None else min(batch_size, n_rounds - rounds_done)
+        results_list, bases, outcomes = _run_rounds(dealer_name, recipient_names, size, eve_target, fidelity, size > 1, engine, rng, formalism=formalism, compiled_noise=compiled_noise)
+
+        valid = are_valid_rounds(bases)
+        parity_passed = check_ghz_parities(bases, outcomes)
+        ss_success, reconstructed, actual = verify_secret_sharing_batch(bases, outcomes)
+        if results_list is None:
+            results_list = to_dicts(party_names, bases, outcomes, valid, parity_passed, ss_success, reconstructed, actual)
+
+        rounds_done += size
+        valid_rounds += int(valid.sum())
+        passed_rounds += int(parity_passed.sum())
+        ss_successes += int(ss_success.sum())
+
+        stats = _summary(rounds_done, valid_rounds, passed_rounds, ss_successes, eve_target)
+        low, high = wilson_interval(valid_rounds - passed_rounds, valid_rounds, confidence)
+        stats["qber_ci"] = (low * 100, high * 100)
+        stats["results"] = results_list
+        yield stats
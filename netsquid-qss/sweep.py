@@ -0,0 +1,70 @@
+import math
+import multiprocessing as mp
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Callable, Dict, List
+
+from sweep_store import SweepStore
+
+# Task kwargs that only add diagnostics (not results), so a stored sweep can be resumed with them toggled
+DIAGNOSTIC_KWARGS = ("profile",)
+
+def _warm_worker(warm_networks: List[tuple]):
+    # Pay the netsquid import and network construction once per worker instead of in the first task
+    if not warm_networks:
+        return
+    from network import create_network, reserve_network_cache
+    reserve_network_cache(len(warm_networks))
+    for dealer_name, recipient_names, eve_target, fidelity in warm_networks:
+        create_network(dealer_name, recipient_names, eve_target, fidelity, cache=True)
+
+# Runs task(point, *args, n_trials=k, first_trial=i, **kwargs) -> Dict[str, list] over every parameter point, split into
+# trial chunks so all workers stay busy. Chunks are submitted most expensive first (longest
+# processing time first) and their lists are concatenated back per point in trial order.
+# With a store directory every finished chunk is checkpointed and reused on the next call.
+# warm_networks lists (dealer, recipients, eve_target, fidelity) networks every worker pre-builds.
+def run_sweep(task: Callable, points: List, n_trials: int, args: tuple = (), cost: Callable = None, chunk_size: int = None, max_workers: int = None, store: str = None, kwargs: Dict = None, warm_networks: List[tuple] = None) -> Dict:
+    max_workers = max_workers or os.cpu_count() or 1
+    if chunk_size is None:
+        chunk_size = math.ceil(n_trials * len(points) / (4 * max_workers))
+    chunk_size = max(1, min(chunk_size, n_trials))
+
+    kwargs = kwargs or {}
+    store = SweepStore(store) if store else None
+    if store:
+        result_kwargs = {key: value for key, value in kwargs.items() if key not in DIAGNOSTIC_KWARGS}
+        chunk_size = store.bind(task.__name__, args, result_kwargs, chunk_size)
+
+    chunks = {point: [] for point in points}
+    tasks = []
+    for point in points:
+        point_cost = cost(point) if cost else 1
+        for start in range(0, n_trials, chunk_size):
+            size = min(chunk_size, n_trials - start)
+            if store and store.has(point, start, size):
+                chunks[point].append((start, store.load(point, start, size)))
+            else:
+                tasks.append((point_cost * size, point, start, size))
+    tasks.sort(key=lambda t: t[0], reverse=True)
+
+    if tasks:
+        with ProcessPoolExecutor(max_workers=max_workers, mp_context=mp.get_context("spawn"), initializer=_warm_worker, initargs=(warm_networks or [],)) as executor:
+            futures = {
+                executor.submit(task, point, *args, n_trials=size, first_trial=start, **kwargs): (point, start, size)
+                for _, point, start, size in tasks
+            }
+            for future in as_completed(futures):
+                point, start, size = futures[future]
+                result = future.result()
+                if store:
+                    store.save(point, start, size, result)
+                chunks[point].append((start, result))
+
+    merged = {}
+    for point, parts in chunks.items():
+        parts.sort(key=lambda part: part[0])
+        merged[point] = {}
+        for _, result in parts:
+            for key, values in result.items():
+                merged[point].setdefault(key, []).extend(values)
+    return merged
@@ -0,0 +1,48 @@
+import json
+import os
+from pathlib import Path
+from typing import Dict, List
+
+import numpy as np
+
+# On-disk store for run_sweep: one npz file per finished (point, trial chunk), written as soon as
+# the chunk completes, so an interrupted sweep resumes from the chunks already on disk.
+class SweepStore:
+    def __init__(self, directory):
+        self.directory = Path(directory)
+        self.meta_path = self.directory / "sweep.json"
+
+    def load_meta(self) -> Dict:
+        if not self.meta_path.exists():
+            return {}
+        return json.loads(self.meta_path.read_text())
+
+    def bind(self, task_name: str, args: tuple, kwargs: Dict, chunk_size: int) -> int:
+        # Chunk boundaries must stay stable across resumes, so the first run fixes the chunk size
+        meta = self.load_meta()
+        if meta:
+            if meta["task"] != task_name or meta["args"] != repr(args) or meta.get("kwargs", "{}") != repr(kwargs):
+                raise ValueError(f"Sweep store {self.directory} belongs to {meta['task']}{meta['args']} {meta.get('kwargs', '{}')}")
+            return meta["chunk_size"]
+
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.meta_path.write_text(json.dumps({"task": task_name, "args": repr(args), "kwargs": repr(kwargs), "chunk_size": chunk_size}))
+        return chunk_size
+
+    def _chunk_path(self, point, start: int, size: int) -> Path:
+        return self.directory / repr(point) / f"{start:08d}_{size}.npz"
+
+    def has(self, point, start: int, size: int) -> bool:
+        return self._chunk_path(point, start, size).exists()
+
+    def save(self, point, start: int, size: int, result: Dict[str, List]):
+        path = self._chunk_path(point, start, size)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_suffix(".tmp")
+        with open(tmp_path, "wb") as f:
+            np.savez(f, **{key: np.asarray(values) for key, values in result.items()})
+        os.replace(tmp_path, path)
+
+    def load(self, point, start: int, size: int) -> Dict[str, List]:
+        with np.load(self._chunk_path(point, start, size)) as data:
+            return {key: data[key].tolist() for key in data.files}
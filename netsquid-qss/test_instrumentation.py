@@ -0,0 +1,28 @@
+from types import SimpleNamespace
+
+import pytest
+
+from instrumentation import format_profile, merge_profiles, new_profile, record_sim_run
+
+def test_missing_event_counter_is_recorded_as_none():
+    profile = new_profile()
+    record_sim_run(profile, "protocols", SimpleNamespace(data={}), 5.0)
+    record_sim_run(profile, "protocols", SimpleNamespace(data={"events_handled": 3}), 5.0)
+    assert profile["phases"]["protocols"]["events"] is None
+    assert profile["phases"]["protocols"]["sim_time"] == 10.0
+    assert merge_profiles([profile, profile])["phases"]["protocols"]["events"] is None
+    assert "protocols" in format_profile(profile)
+
+def test_event_counter_is_summed():
+    profile = new_profile()
+    for events in (3, 4):
+        record_sim_run(profile, "protocols", SimpleNamespace(data={"events_handled": events}), 1.0)
+    assert merge_profiles([profile, profile])["phases"]["protocols"]["events"] == 14
+
+def test_netsquid_sim_stats_has_event_counter():
+    ns = pytest.importorskip("netsquid")
+    from simulate import run_simulation
+    stats = run_simulation("Alice", ["Bob", "Charlie"], 5, multi_round=True, seed=0, profile=True)
+    assert ns.sim_stats().data["events_handled"] > 0
+    assert stats["profile"]["phases"]["protocols"]["events"] > 0
+    assert stats["profile"]["max_qstate_qubits"] == 3
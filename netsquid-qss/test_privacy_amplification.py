@@ -0,0 +1,35 @@
+import numpy as np
+import pytest
+
+from privacy_amplification import amplify, output_length, toeplitz_hash, toeplitz_seed
+
+def toeplitz_matrix(toeplitz, n_bits, out_bits):
+    # T[i, j] = toeplitz[i - j + n - 1], built entry by entry
+    return np.array([[toeplitz[i - j + n_bits - 1] for j in range(n_bits)] for i in range(out_bits)], dtype=np.int64)
+
+@pytest.mark.parametrize("n_bits, out_bits", [(1, 1), (7, 3), (64, 64), (300, 120), (1000, 1)])
+def test_hash_matches_matrix_product(n_bits, out_bits):
+    key = np.random.default_rng(n_bits).integers(0, 2, size=n_bits, dtype=np.uint8)
+    toeplitz = toeplitz_seed(n_bits, out_bits, seed=out_bits)
+    expected = toeplitz_matrix(toeplitz, n_bits, out_bits) @ key % 2
+    assert (toeplitz_hash(key, toeplitz, out_bits) == expected).all()
+
+def test_long_key_stays_exact():
+    # Convolution sums reach n_bits, well within the float64 precision of the FFT
+    n_bits, out_bits = 50_000, 20_000
+    key = np.random.default_rng(0).integers(0, 2, size=n_bits, dtype=np.uint8)
+    toeplitz = toeplitz_seed(n_bits, out_bits, seed=1)
+    hashed = toeplitz_hash(key, toeplitz, out_bits)
+    rows = np.random.default_rng(2).choice(out_bits, size=50, replace=False)
+    for i in rows:
+        row = toeplitz[i + n_bits - 1 - np.arange(n_bits)]
+        assert hashed[i] == int(row.astype(np.int64) @ key) % 2
+
+def test_seed_length_is_checked():
+    with pytest.raises(ValueError):
+        toeplitz_hash(np.ones(10, dtype=np.uint8), np.ones(10, dtype=np.uint8), 5)
+
+def test_amplify_output_length():
+    key = np.random.default_rng(0).integers(0, 2, size=10_000, dtype=np.uint8)
+    assert len(amplify(key, 0.02, seed=0)) == output_length(10_000, 0.02)
+    assert len(amplify(key[:50], 0.02, seed=0)) == 0
@@ -0,0 +1,34 @@
+import numpy as np
+import pytest
+
+from reconciliation import cascade, sifted_bits
+from sampler import sample_rounds
+
+def noisy_copy(n_bits, qber, seed):
+    rng = np.random.default_rng(seed)
+    reference = rng.integers(0, 2, size=n_bits, dtype=np.uint8)
+    errors = rng.random(n_bits) < qber
+    return reference, reference ^ errors.astype(np.uint8)
+
+@pytest.mark.parametrize("qber", [0.01, 0.03, 0.08])
+@pytest.mark.parametrize("seed", [0, 1, 2])
+def test_cascade_leaves_no_residual_errors(qber, seed):
+    reference, noisy = noisy_copy(20_000, qber, seed)
+    result = cascade(reference, noisy, qber, seed=seed)
+    assert result["residual_errors"] == 0
+    assert (result["key"] == reference).all()
+    # Correcting the errors cannot disclose less than their entropy
+    assert result["leaked_bits"] > np.count_nonzero(reference != noisy)
+
+def test_cascade_without_errors_only_discloses_block_parities():
+    reference, _ = noisy_copy(1000, 0.0, 0)
+    result = cascade(reference, reference, 0.02, n_passes=1)
+    assert result["residual_errors"] == 0
+    assert result["leaked_bits"] == int(np.ceil(1000 / 37))
+    assert result["round_trips"] == 1
+
+def test_sifted_bits_agree_on_ideal_rounds():
+    bases, outcomes = sample_rounds(3, 5000, rng=np.random.default_rng(0))
+    actual, reconstructed = sifted_bits(bases, outcomes)
+    assert len(actual) == np.count_nonzero(bases.sum(axis=1) % 2 == 0)
+    assert (actual == reconstructed).all()
@@ -0,0 +1,48 @@
+import os
+
+import pytest
+
+pytest.importorskip("netsquid")
+
+import result_cache
+
+@pytest.fixture
+def cache_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(result_cache, "CACHE_DIR", tmp_path)
+    monkeypatch.setattr(result_cache, "CACHE_MAX_BYTES", 1000)
+    monkeypatch.setattr(result_cache, "CACHE_EVICT_TO_BYTES", 750)
+    monkeypatch.setattr(result_cache, "_cache_bytes", None)
+    return tmp_path
+
+def write_entry(cache_dir, index, size=100):
+    path = cache_dir / f"{index}.pkl"
+    path.write_bytes(b"x" * size)
+    os.utime(path, (index, index))
+    result_cache._add_cache_bytes(size)
+
+def test_eviction_scans_only_past_the_cap(cache_dir, monkeypatch):
+    scans = []
+    entries = result_cache._cache_entries
+    monkeypatch.setattr(result_cache, "_cache_entries", lambda: scans.append(1) or entries())
+    for index in range(10):
+        write_entry(cache_dir, index)
+    # The first write scans to learn the size; the cap is not passed yet
+    assert len(scans) == 1 and result_cache._cache_bytes == 1000
+
+    write_entry(cache_dir, 10)
+    assert len(scans) == 2
+    # Least recently used entries go first, down to the low-water mark
+    assert sorted(int(path.stem) for path in cache_dir.glob("*.pkl")) == list(range(4, 11))
+    assert result_cache._cache_bytes == 700
+
+    write_entry(cache_dir, 11)
+    assert len(scans) == 2
+
+def test_eviction_counts_other_writers(cache_dir):
+    write_entry(cache_dir, 0)
+    # Another process fills the cache; its entries are found by the scan once this one passes the cap
+    for index in range(1, 10):
+        (cache_dir / f"{index}.pkl").write_bytes(b"x" * 100)
+    for index in range(10, 20):
+        write_entry(cache_dir, index)
+    assert sum(path.stat().st_size for path in cache_dir.glob("*.pkl")) <= 1000
@@ -0,0 +1,38 @@
+import numpy as np
+import pytest
+
+from sampler import flip_probability, sample_rounds
+from validation import are_valid_rounds, check_ghz_parities
+
+N_ROUNDS = 200_000
+
+def error_rate(bases, outcomes):
+    valid = are_valid_rounds(bases)
+    return 1 - check_ghz_parities(bases, outcomes)[valid].mean()
+
+def test_shapes_and_values():
+    bases, outcomes = sample_rounds(3, 100, rng=np.random.default_rng(0))
+    assert bases.shape == outcomes.shape == (100, 4)
+    assert bases.dtype == outcomes.dtype == np.int8
+    assert set(np.unique(bases)) <= {0, 1} and set(np.unique(outcomes)) <= {0, 1}
+
+def test_ideal_rounds_always_pass():
+    bases, outcomes = sample_rounds(3, N_ROUNDS, rng=np.random.default_rng(1))
+    assert error_rate(bases, outcomes) == 0
+
+@pytest.mark.parametrize("n_recipients, fidelity", [(2, 0.95), (3, 0.99), (5, 0.9)])
+def test_qber_matches_flip_rate(n_recipients, fidelity):
+    # A round fails when an odd number of recipient outcomes flipped
+    p = flip_probability(fidelity)
+    expected = (1 - (1 - 2 * p) ** n_recipients) / 2
+    bases, outcomes = sample_rounds(n_recipients, N_ROUNDS, fidelity, rng=np.random.default_rng(2))
+    assert error_rate(bases, outcomes) == pytest.approx(expected, abs=4 * np.sqrt(expected / (N_ROUNDS / 2)))
+
+def test_eve_causes_quarter_errors():
+    bases, outcomes = sample_rounds(3, N_ROUNDS, eve_index=1, rng=np.random.default_rng(3))
+    assert error_rate(bases, outcomes) == pytest.approx(0.25, abs=0.01)
+
+def test_seeded_runs_repeat():
+    first = sample_rounds(3, 1000, 0.95, rng=np.random.default_rng(4))
+    second = sample_rounds(3, 1000, 0.95, rng=np.random.default_rng(4))
+    assert all((a == b).all() for a, b in zip(first, second))
@@ -0,0 +1,40 @@
+import random
+
+import pytest
+
+ns = pytest.importorskip("netsquid")
+
+from network import create_network
+from simulate import run_simulation, run_single_round
+
+RECIPIENTS = ["Bob", "Charlie"]
+
+def test_single_round_finishes():
+    # The dealer's basis reaches the recipients before their qubits do; the round must still complete
+    random.seed(0)
+    ns.set_random_state(seed=0)
+    nodes, eve_node = create_network("Alice", RECIPIENTS)
+    for _ in range(20):
+        result = run_single_round(nodes, "Alice", RECIPIENTS, eve_node)
+        assert set(result["bases"]) == set(result["outcomes"]) == {"Alice", *RECIPIENTS}
+        if result["valid"]:
+            assert result["parity_passed"] and result["secret_sharing_success"]
+
+def test_single_round_with_eve_finishes():
+    stats = run_simulation("Alice", RECIPIENTS, 50, eve_target="Bob", seed=1)
+    assert stats["n_rounds"] == 50 and stats["eve_present"]
+
+@pytest.mark.parametrize("eve_target", [None, "Bob"])
+def test_multi_round_matches_single_round(eve_target):
+    single = run_simulation("Alice", RECIPIENTS, 200, eve_target=eve_target, seed=2)
+    multi = run_simulation("Alice", RECIPIENTS, 200, eve_target=eve_target, multi_round=True, seed=2)
+    assert single.keys() == multi.keys()
+    assert [r.keys() for r in single["results"]] == [r.keys() for r in multi["results"]]
+    for stats in (single, multi):
+        # Half of the rounds are valid, and without Eve every valid round passes the parity check
+        assert stats["valid_rounds"] == pytest.approx(100, abs=30)
+        if eve_target is None:
+            assert stats["passed_rounds"] == stats["valid_rounds"] and stats["qber"] == 0
+        else:
+            assert stats["qber"] == pytest.approx(25, abs=15)
+    assert multi == run_simulation("Alice", RECIPIENTS, 200, eve_target=eve_target, multi_round=True, seed=2)
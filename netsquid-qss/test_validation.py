@@ -0,0 +1,40 @@
+import numpy as np
+import pytest
+
+from validation import (are_valid_rounds, check_ghz_parities, check_ghz_parity, is_valid_round, results_to_arrays,
+                        verify_secret_sharing, verify_secret_sharing_batch)
+
+PARTY_NAMES = ["Alice", "Bob", "Charlie", "Diana"]
+
+def round_dicts(bases, outcomes):
+    return [({name: "XY"[b] for name, b in zip(PARTY_NAMES, row_bases)}, {name: int(m) for name, m in zip(PARTY_NAMES, row_outcomes)})
+            for row_bases, row_outcomes in zip(bases, outcomes)]
+
+@pytest.fixture
+def rounds():
+    rng = np.random.default_rng(0)
+    bases = rng.integers(0, 2, size=(500, len(PARTY_NAMES)), dtype=np.int8)
+    outcomes = rng.integers(0, 2, size=(500, len(PARTY_NAMES)), dtype=np.int8)
+    return bases, outcomes
+
+def test_batch_matches_per_round_checks(rounds):
+    bases, outcomes = rounds
+    valid = are_valid_rounds(bases)
+    parity_passed = check_ghz_parities(bases, outcomes)
+    ss_success, reconstructed, actual = verify_secret_sharing_batch(bases, outcomes)
+
+    for i, (round_bases, round_outcomes) in enumerate(round_dicts(bases, outcomes)):
+        assert valid[i] == is_valid_round(round_bases)
+        assert parity_passed[i] == check_ghz_parity(round_bases, round_outcomes)
+        success, round_reconstructed, round_actual = verify_secret_sharing(round_bases, round_outcomes, "Alice")
+        assert ss_success[i] == success
+        assert reconstructed[i] == (-1 if round_reconstructed is None else round_reconstructed)
+        assert actual[i] == (-1 if round_actual is None else round_actual)
+
+def test_results_to_arrays_round_trip(rounds):
+    bases, outcomes = rounds
+    # Outcomes may also come as one-element lists, as the netsquid protocols report them
+    results = [{"bases": round_bases, "outcomes": {name: [m] for name, m in round_outcomes.items()}}
+               for round_bases, round_outcomes in round_dicts(bases, outcomes)]
+    result_bases, result_outcomes = results_to_arrays(results, PARTY_NAMES)
+    assert (result_bases == bases).all() and (result_outcomes == outcomes).all()
@@ -1,4 +1,6 @@
-from typing import Dict, Tuple
+from typing import Dict, List, Tuple
+
+import numpy as np
 
 def count_y_bases(bases: Dict[str, str]) -> int:
     return sum(1 for b in bases.values() if b == "Y")
@@ -54,4 +56,42 @@ def verify_secret_sharing(bases: Dict[str, str], outcomes: Dict[str, int], deale
 
     reconstructed = reconstruct_dealer_secret(bases, outcomes, dealer_name)
     success = (reconstructed == actual)
-    return success, reconstructed, actual
\ No newline at end of file
+    return success, reconstructed, actual
+
+# Batch versions of the checks above. Each takes a (rounds x parties) basis matrix coded
+# 0 = X, 1 = Y and a matching 0/1 outcome matrix, with the dealer in column dealer_index.
+
+def y_counts(bases: np.ndarray) -> np.ndarray:
+    return np.asarray(bases).sum(axis=1, dtype=np.int64)
+
+def are_valid_rounds(bases: np.ndarray) -> np.ndarray:
+    return y_counts(bases) % 2 == 0
+
+def check_ghz_parities(bases: np.ndarray, outcomes: np.ndarray) -> np.ndarray:
+    y_count = y_counts(bases)
+    parity = np.bitwise_xor.reduce(np.asarray(outcomes, dtype=np.int8), axis=1)
+    return (y_count % 2 == 0) & (parity == (y_count // 2) % 2)
+
+def reconstruct_dealer_secrets(bases: np.ndarray, outcomes: np.ndarray, dealer_index: int = 0) -> np.ndarray:
+    # Invalid rounds are marked with -1, the batch counterpart of None
+    y_count = y_counts(bases)
+    outcomes = np.asarray(outcomes, dtype=np.int8)
+    recipient_parity = np.bitwise_xor.reduce(np.delete(outcomes, dealer_index, axis=1), axis=1)
+    reconstructed = recipient_parity ^ ((y_count // 2) % 2).astype(np.int8)
+    return np.where(y_count % 2 == 0, reconstructed, -1).astype(np.int8)
+
+def verify_secret_sharing_batch(bases: np.ndarray, outcomes: np.ndarray, dealer_index: int = 0) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    valid = are_valid_rounds(bases)
+    actual = np.where(valid, np.asarray(outcomes, dtype=np.int8)[:, dealer_index], -1).astype(np.int8)
+    reconstructed = reconstruct_dealer_secrets(bases, outcomes, dealer_index)
+    success = valid & (reconstructed == actual)
+    return success, reconstructed, actual
+
+def results_to_arrays(results: List[Dict], party_names: List[str]) -> Tuple[np.ndarray, np.ndarray]:
+    bases = np.array([[1 if r["bases"][name] == "Y" else 0 for name in party_names] for r in results], dtype=np.int8)
+    outcomes = np.empty_like(bases)
+    for i, r in enumerate(results):
+        for j, name in enumerate(party_names):
+            outcome = r["outcomes"][name]
+            outcomes[i, j] = outcome[0] if isinstance(outcome, (list, tuple)) else outcome
+    return bases.reshape(len(results), len(party_names)), outcomes.reshape(len(results), len(party_names))
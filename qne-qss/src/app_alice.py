@@ -1,15 +1,16 @@
-from dataclasses import dataclass
-from typing import Optional
-
-from netqasm.sdk.classical_communication.message import StructuredMessage
 from netqasm.sdk.external import NetQASMConnection, Socket
 from netqasm.sdk import EPRSocket
 from netqasm.sdk.toolbox.multi_node import create_ghz
 
+from ghz_batch import batches, sync_due, measure_ghz_batch, send_corrections
+from telemetry import Telemetry, timed
+from triplet_table import TripletTable
+from wire import WireStats, encode_bits, decode_bits, decode_outcomes, broadcast_encoded, recv_encoded
+
 import random
 from rich.progress import Progress, TimeElapsedColumn, SpinnerColumn, MofNCompleteColumn
 
-def distribute_ghz_states(conn, down_epr_socket, down_socket, up_epr_socket, up_socket, n_bits):
+def distribute_ghz_states(conn, down_epr_socket, down_socket, up_epr_socket, up_socket, n_bits, sync_window=1, telemetry=None):
     bases = [random.randint(0, 1) for _ in range(n_bits)] # 0 = X, 1 = Y
     outcomes = [None for _ in range(n_bits)]
 
@@ -17,111 +18,73 @@ def distribute_ghz_states(conn, down_epr_socket, down_socket, up_epr_socket, up_
         task = p.add_task("Distributing GHZ states...", total=n_bits)
 
         for i in range(n_bits):
-            q, _ = create_ghz(
-                down_epr_socket=down_epr_socket,
-                down_socket=down_socket,
-                up_epr_socket=up_epr_socket,
-                up_socket=up_socket,
-                do_corrections=True
-            )
+            with timed(telemetry, "ghz"):
+                q, _ = create_ghz(
+                    down_epr_socket=down_epr_socket,
+                    down_socket=down_socket,
+                    up_epr_socket=up_epr_socket,
+                    up_socket=up_socket,
+                    do_corrections=True
+                )
             if bases[i] == 1:
                 q.rot_Z(n=3, d=1)
             q.H()
             m = q.measure()
-            conn.flush()
-            down_socket.recv_silent()
-            down_socket.send_silent("")
-            up_socket.send_silent("")
-            up_socket.recv_silent()
+            with timed(telemetry, "flush"):
+                conn.flush()
+            if sync_due(i, i + 1, n_bits, sync_window):
+                with timed(telemetry, "sync"):
+                    down_socket.recv_silent()
+                    down_socket.send_silent("")
+                    up_socket.send_silent("")
+                    up_socket.recv_silent()
             outcomes[i] = int(m)
 
             p.update(task, advance=1)
 
     return bases, outcomes
 
-def exchange_bases(bob_socket, charlie_socket, triplets_info):
-    alice_bases = [triplet.alice_basis for triplet in triplets_info]
-    bob_bases = bob_socket.recv_structured().payload
-    charlie_bases = charlie_socket.recv_structured().payload
-
-    bob_socket.send_structured(StructuredMessage(header="Bases", payload=alice_bases))
-    bob_socket.send_structured(StructuredMessage(header="Bases", payload=charlie_bases))
-
-    charlie_socket.send_structured(StructuredMessage(header="Bases", payload=alice_bases))
-    charlie_socket.send_structured(StructuredMessage(header="Bases", payload=bob_bases))
-
-    for i in range(len(triplets_info)):
-        triplets_info[i].bob_basis = bob_bases[i]
-        triplets_info[i].charlie_basis = charlie_bases[i]
-    
-    return triplets_info
-
-def sift_bases(triplets_info):
-    for triplet in triplets_info:
-        if (triplet.alice_basis + triplet.bob_basis + triplet.charlie_basis) % 2 == 0:
-            triplet.is_valid = True
-        else:
-            triplet.is_valid = False
-
-    return triplets_info
-
-def receive_outcomes_for_qber(bob_socket, charlie_socket, triplets_info):
-    bob_outcomes = bob_socket.recv_structured().payload
-    charlie_outcomes = charlie_socket.recv_structured().payload
-
-    for outcome in bob_outcomes:
-        triplets_info[outcome[0]].bob_outcome = outcome[1]
-    
-    for outcome in charlie_outcomes:
-        triplets_info[outcome[0]].charlie_outcome = outcome[1]
-    
-    return triplets_info
-
-def calculate_qber(triplets_info, test_num_rounds):
-    qber = 0
-
-    for triplet in triplets_info:
-        if triplet.is_valid and triplet.bob_outcome != None and triplet.charlie_outcome != None:
-            xor = triplet.alice_outcome ^ triplet.bob_outcome ^ triplet.charlie_outcome
-
-            if triplet.alice_basis + triplet.bob_basis + triplet.charlie_basis == 0:
-                qber += xor % 2 + 1
-            else:
-                qber += xor
-    
-    return 1 - (qber / test_num_rounds)
-
-
-@dataclass
-class TripletInfo:
-    """Information that Alice has about one generated triplet.
-    The information is filled progressively during the protocol."""
+def distribute_ghz_batches(conn, down_epr_socket, down_socket, up_epr_socket, up_socket, n_bits, batch_size, sync_window=1, stats=None, telemetry=None):
+    bases = [random.randint(0, 1) for _ in range(n_bits)] # 0 = X, 1 = Y
+    outcomes = []
 
-    # Index in list of all generated pairs.
-    index: int
+    with Progress(SpinnerColumn(), *Progress.get_default_columns(), TimeElapsedColumn(), MofNCompleteColumn()) as p:
+        task = p.add_task("Distributing GHZ states...", total=n_bits)
 
-    # True if Bob and Charlie can deduct Alice's bit when they cooperate
-    is_valid: Optional[bool] = None
+        for start, stop in batches(n_bits, batch_size):
+            with timed(telemetry, "ghz", stop - start):
+                batch_outcomes, fusions = measure_ghz_batch(conn, bases[start:stop], down_epr_socket, up_epr_socket)
+            # The start node never needs a correction, so only the fusion outcomes travel up
+            with timed(telemetry, "corrections", stop - start):
+                send_corrections(up_socket, fusions, stats)
+            if sync_due(start, stop, n_bits, sync_window):
+                with timed(telemetry, "sync"):
+                    down_socket.recv_silent()
+                    down_socket.send_silent("")
+                    up_socket.send_silent("")
+                    up_socket.recv_silent()
+            outcomes.extend(batch_outcomes)
+
+            p.update(task, advance=stop - start)
 
-    # Basis Alice measured in. 0 = X, 1 = Y.
-    alice_basis: Optional[int] = None
+    return bases, outcomes
 
-    # Basis Bob measured in. 0 = X, 1 = Y.
-    bob_basis: Optional[int] = None
+def exchange_bases(bob_socket, charlie_socket, table, stats=None):
+    # Every party broadcasts its own bases, so nothing is relayed through Alice
+    broadcast_encoded([bob_socket, charlie_socket], "Bases", encode_bits, table.alice_basis.tolist(), stats=stats)
 
-    # Basis Charlie measured in. 0 = X, 1 = Y.
-    charlie_basis: Optional[int] = None
+    table.set_bases("bob", recv_encoded(bob_socket, decode_bits, stats))
+    table.set_bases("charlie", recv_encoded(charlie_socket, decode_bits, stats))
 
-    # Alice measurement outcome (0 or 1).
-    alice_outcome: Optional[int] = None
+    return table
 
-    # Bob measurement outcome (0 or 1).
-    bob_outcome: Optional[int] = None
+def receive_outcomes_for_qber(bob_socket, charlie_socket, table, stats=None):
+    table.set_outcomes("bob", recv_encoded(bob_socket, decode_outcomes, stats))
+    table.set_outcomes("charlie", recv_encoded(charlie_socket, decode_outcomes, stats))
 
-    # Charlie measurement outcome (0 or 1).
-    charlie_outcome: Optional[int] = None
+    return table
 
-def main(app_config=None, num_rounds=10, eve_intercept=0):
+def main(app_config=None, num_rounds=10, eve_intercept=0, batch_size=1, sync_window=1):
     # Initialize classical communication sockets
     bob_socket = Socket("alice", "bob", log_config=app_config.log_config)
     charlie_socket = Socket("alice", "charlie", log_config=app_config.log_config)
@@ -139,38 +102,39 @@ def main(app_config=None, num_rounds=10, eve_intercept=0):
         epr_sockets=[bob_epr_socket, charlie_epr_socket, eve_epr_socket]
     )
 
+    down_epr_socket, down_socket = (bob_epr_socket, bob_socket) if eve_intercept == 0 else (eve_epr_socket, eve_socket)
+
+    wire_stats = WireStats()
+    telemetry = Telemetry()
+
     with alice:
-        if eve_intercept == 0:
-            bases, outcomes = distribute_ghz_states(alice, bob_epr_socket, bob_socket, charlie_epr_socket, charlie_socket, num_rounds)
+        if batch_size > 1:
+            bases, outcomes = distribute_ghz_batches(alice, down_epr_socket, down_socket, charlie_epr_socket, charlie_socket, num_rounds, batch_size, sync_window, wire_stats, telemetry)
         else:
-            bases, outcomes = distribute_ghz_states(alice, eve_epr_socket, eve_socket, charlie_epr_socket, charlie_socket, num_rounds)
+            bases, outcomes = distribute_ghz_states(alice, down_epr_socket, down_socket, charlie_epr_socket, charlie_socket, num_rounds, sync_window, telemetry)
 
-    triplets_info = []
-    for i in range(num_rounds):
-        triplets_info.append(
-            TripletInfo(
-                index=i,
-                alice_basis=bases[i],
-                alice_outcome=outcomes[i]
-            )
-        )
-        
-    triplets_info = exchange_bases(bob_socket, charlie_socket, triplets_info)
-    triplets_info = sift_bases(triplets_info)
+    table = TripletTable.from_measurements("alice", bases, outcomes)
+    with timed(telemetry, "basis_exchange"):
+        table = exchange_bases(bob_socket, charlie_socket, table, wire_stats).sift()
 
-    valid_amount = sum(list(map(lambda triplet: 1 if triplet.is_valid else 0, triplets_info)))
+    valid_amount = table.valid_amount
 
-    triplets_info = receive_outcomes_for_qber(bob_socket, charlie_socket, triplets_info)
+    with timed(telemetry, "outcome_exchange"):
+        table = receive_outcomes_for_qber(bob_socket, charlie_socket, table, wire_stats)
 
-    qber = calculate_qber(triplets_info, max(valid_amount // 4, 1)) if valid_amount > 0 else -1
+    qber = table.qber(max(valid_amount // 4, 1)) if valid_amount > 0 else -1
 
     print("QBER: " + str(round(qber, 2)))
+    print(f"Classical traffic: {wire_stats.bytes_sent + wire_stats.bytes_received} bytes, serialization {(wire_stats.encode_seconds + wire_stats.decode_seconds) * 1e3:.3f} ms")
 
     return {
         "role": "alice",
         "num_rounds": num_rounds,
         "qber": round(qber, 4),
-        "key_rate": round(valid_amount / num_rounds, 4)  # Fraction of rounds that were valid
+        "key_rate": round(valid_amount / num_rounds, 4),  # Fraction of rounds that were valid
+        **wire_stats.as_result(),
+        "telemetry": telemetry.as_result(),
+        "latency": telemetry.as_rows("alice")
     }
 
 if __name__ == "__main__":
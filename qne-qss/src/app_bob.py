@@ -1,42 +1,48 @@
-from dataclasses import dataclass
-from typing import Optional
-
-from netqasm.sdk.classical_communication.message import StructuredMessage
 from netqasm.sdk.external import NetQASMConnection, Socket
 from netqasm.sdk import EPRSocket
 from netqasm.sdk.toolbox.multi_node import create_ghz
 
+from ghz_batch import batches, sync_due, measure_ghz_batch, apply_corrections, recv_corrections
+from telemetry import Telemetry, timed
+from triplet_table import TripletTable
+from wire import WireStats, encode_bits, decode_bits, encode_outcomes, send_encoded, broadcast_encoded, recv_encoded
+
 import random
 
-def distribute_ghz_states(conn, up_epr_socket, up_socket, n_bits):
+def distribute_ghz_states(conn, up_epr_socket, up_socket, n_bits, sync_window=1, telemetry=None):
     bases = [random.randint(0, 1) for _ in range(n_bits)] # 0 = X, 1 = Y
     outcomes = [None for _ in range(n_bits)]
 
     for i in range(n_bits):
-        q, _ = create_ghz(
-            up_epr_socket=up_epr_socket,
-            up_socket=up_socket,
-            do_corrections=True
-        )
+        with timed(telemetry, "ghz"):
+            q, _ = create_ghz(
+                up_epr_socket=up_epr_socket,
+                up_socket=up_socket,
+                do_corrections=True
+            )
         if bases[i] == 1:
             q.rot_Z(n=3, d=1)
         q.H()
         m = q.measure()
-        conn.flush()
-        up_socket.send_silent("")
-        up_socket.recv_silent()
+        with timed(telemetry, "flush"):
+            conn.flush()
+        if sync_due(i, i + 1, n_bits, sync_window):
+            with timed(telemetry, "sync"):
+                up_socket.send_silent("")
+                up_socket.recv_silent()
         outcomes[i] = int(m)
 
     return bases, outcomes
 
-def receive_from_eve(conn, eve_epr_socket, eve_socket, n_bits):
+def receive_from_eve(conn, eve_epr_socket, eve_socket, n_bits, sync_window=1, telemetry=None):
     bases = [random.randint(0, 1) for _ in range(n_bits)] # 0 = X, 1 = Y
     outcomes = [None for _ in range(n_bits)]
 
     for i in range(n_bits):
         q = eve_epr_socket.recv_keep()[0]
-        m1 = eve_socket.recv_structured().payload
-        m2 = eve_socket.recv_structured().payload
+        with timed(telemetry, "corrections"):
+            m1 = eve_socket.recv_structured().payload
+            m2 = eve_socket.recv_structured().payload
 
         if m2 == 1:
             q.X()
@@ -48,83 +54,69 @@ def receive_from_eve(conn, eve_epr_socket, eve_socket, n_bits):
         q.H()
         m = q.measure()
 
-        conn.flush()
+        with timed(telemetry, "flush"):
+            conn.flush()
 
-        eve_socket.recv_silent()
-        eve_socket.send_silent("")
+        if sync_due(i, i + 1, n_bits, sync_window):
+            with timed(telemetry, "sync"):
+                eve_socket.recv_silent()
+                eve_socket.send_silent("")
         outcomes[i] = int(m)
 
     return bases, outcomes
 
-def exchange_bases(alice_socket, triplets_info):
-    bob_bases = [triplet.bob_basis for triplet in triplets_info]
-
-    alice_socket.send_structured(StructuredMessage(header="Bases", payload=bob_bases))
-    
-    alice_bases = alice_socket.recv_structured().payload
-    charlie_bases = alice_socket.recv_structured().payload
+def distribute_ghz_batches(conn, up_epr_socket, up_socket, n_bits, batch_size, sync_window=1, telemetry=None):
+    bases = [random.randint(0, 1) for _ in range(n_bits)] # 0 = X, 1 = Y
+    outcomes = []
 
-    for i in range(len(triplets_info)):
-        triplets_info[i].alice_basis = alice_bases[i]
-        triplets_info[i].charlie_basis = charlie_bases[i]
-    
-    return triplets_info
+    for start, stop in batches(n_bits, batch_size):
+        with timed(telemetry, "ghz", stop - start):
+            batch_outcomes, _ = measure_ghz_batch(conn, bases[start:stop], up_epr_socket=up_epr_socket)
+        if sync_due(start, stop, n_bits, sync_window):
+            with timed(telemetry, "sync"):
+                up_socket.send_silent("")
+                up_socket.recv_silent()
+        outcomes.extend(batch_outcomes)
 
-def sift_bases(triplets_info):
-    for triplet in triplets_info:
-        if (triplet.alice_basis + triplet.bob_basis + triplet.charlie_basis) % 2 == 0:
-            triplet.is_valid = True
-        else:
-            triplet.is_valid = False
+    return bases, outcomes
 
-    return triplets_info
+def receive_batches_from_eve(conn, eve_epr_socket, eve_socket, n_bits, batch_size, sync_window=1, stats=None, telemetry=None):
+    bases = [random.randint(0, 1) for _ in range(n_bits)] # 0 = X, 1 = Y
+    outcomes = []
+
+    for start, stop in batches(n_bits, batch_size):
+        with timed(telemetry, "ghz", stop - start):
+            batch_outcomes, _ = measure_ghz_batch(conn, bases[start:stop], down_epr_socket=eve_epr_socket)
+        with timed(telemetry, "corrections", stop - start):
+            m1 = recv_corrections(eve_socket, stats)
+            m2 = recv_corrections(eve_socket, stats)
+        if sync_due(start, stop, n_bits, sync_window):
+            with timed(telemetry, "sync"):
+                eve_socket.recv_silent()
+                eve_socket.send_silent("")
+        outcomes.extend(apply_corrections(bases[start:stop], batch_outcomes, x_flips=m2, z_flips=m1))
 
-def send_outcomes_for_qber(socket, triplets_info, test_num_rounds):
-    valid_outcomes = list(map(
-        lambda triplet: (triplet.index, triplet.bob_outcome),
-        list(filter(
-            lambda triplet: triplet.is_valid,
-            triplets_info
-        ))
-    ))
+    return bases, outcomes
 
-    socket.send_structured(StructuredMessage(header="Outcomes", payload=valid_outcomes[:test_num_rounds]))
+def exchange_bases(alice_socket, charlie_socket, table, stats=None):
+    broadcast_encoded([alice_socket, charlie_socket], "Bases", encode_bits, table.bob_basis.tolist(), stats=stats)
     
-    return
-
-
-@dataclass
-class TripletInfo:
-    """Information that Alice has about one generated triplet.
-    The information is filled progressively during the protocol."""
-
-    # Index in list of all generated pairs.
-    index: int
-
-    # True if Bob and Charlie can deduct Alice's bit when they cooperate
-    is_valid: Optional[bool] = None
-
-    # Basis Alice measured in. 0 = X, 1 = Y.
-    alice_basis: Optional[int] = None
-
-    # Basis Bob measured in. 0 = X, 1 = Y.
-    bob_basis: Optional[int] = None
-
-    # Basis Charlie measured in. 0 = X, 1 = Y.
-    charlie_basis: Optional[int] = None
-
-    # Alice measurement outcome (0 or 1).
-    alice_outcome: Optional[int] = None
+    table.set_bases("alice", recv_encoded(alice_socket, decode_bits, stats))
+    table.set_bases("charlie", recv_encoded(charlie_socket, decode_bits, stats))
+    
+    return table
 
-    # Bob measurement outcome (0 or 1).
-    bob_outcome: Optional[int] = None
+def send_outcomes_for_qber(socket, table, test_num_rounds, stats=None):
+    valid_outcomes = table.test_outcomes("bob", test_num_rounds)
 
-    # Charlie measurement outcome (0 or 1).
-    charlie_outcome: Optional[int] = None
+    send_encoded(socket, "Outcomes", encode_outcomes, table.num_rounds, valid_outcomes, stats=stats)
+    
+    return
 
-def main(app_config=None, num_rounds=4, eve_intercept=0):
+def main(app_config=None, num_rounds=4, eve_intercept=0, batch_size=1, sync_window=1):
     # Initialize classical communication sockets
     alice_socket = Socket("bob", "alice", log_config=app_config.log_config)
+    charlie_socket = Socket("bob", "charlie", log_config=app_config.log_config)
     eve_socket = Socket("bob", "eve", log_config=app_config.log_config)
 
     # Initialize quantum EPR sockets for entanglement with Alice and Eve
@@ -138,32 +130,34 @@ def main(app_config=None, num_rounds=4, eve_intercept=0):
         epr_sockets=[alice_epr_socket, eve_epr_socket]
     )
 
+    wire_stats = WireStats()
+    telemetry = Telemetry()
+
     with bob:
-        if eve_intercept == 0:
-            bases, outcomes = distribute_ghz_states(bob, alice_epr_socket, alice_socket, num_rounds)
+        if eve_intercept == 0 and batch_size > 1:
+            bases, outcomes = distribute_ghz_batches(bob, alice_epr_socket, alice_socket, num_rounds, batch_size, sync_window, telemetry)
+        elif eve_intercept == 0:
+            bases, outcomes = distribute_ghz_states(bob, alice_epr_socket, alice_socket, num_rounds, sync_window, telemetry)
+        elif batch_size > 1:
+            bases, outcomes = receive_batches_from_eve(bob, eve_epr_socket, eve_socket, num_rounds, batch_size, sync_window, wire_stats, telemetry)
         else:
-            bases, outcomes = receive_from_eve(bob, eve_epr_socket, eve_socket, num_rounds)
-
-    triplets_info = []
-    for i in range(num_rounds):
-        triplets_info.append(
-            TripletInfo(
-                index=i,
-                bob_basis=bases[i],
-                bob_outcome=outcomes[i]
-            )
-        )
-    
-    triplets_info = exchange_bases(alice_socket, triplets_info)
-    triplets_info = sift_bases(triplets_info)
-    
-    valid_amount = sum(list(map(lambda triplet: 1 if triplet.is_valid else 0, triplets_info)))
+            bases, outcomes = receive_from_eve(bob, eve_epr_socket, eve_socket, num_rounds, sync_window, telemetry)
+
+    table = TripletTable.from_measurements("bob", bases, outcomes)
+    with timed(telemetry, "basis_exchange"):
+        table = exchange_bases(alice_socket, charlie_socket, table, wire_stats).sift()
+
+    valid_amount = table.valid_amount
 
-    send_outcomes_for_qber(alice_socket, triplets_info, max(valid_amount // 4, 1))
+    with timed(telemetry, "outcome_exchange"):
+        send_outcomes_for_qber(alice_socket, table, max(valid_amount // 4, 1), wire_stats)
 
     return {
         "role": "bob",
-        "num_rounds": num_rounds
+        "num_rounds": num_rounds,
+        **wire_stats.as_result(),
+        "telemetry": telemetry.as_result(),
+        "latency": telemetry.as_rows("bob")
     }
 
 if __name__ == "__main__":
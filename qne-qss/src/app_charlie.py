@@ -1,102 +1,75 @@
-from dataclasses import dataclass
-from typing import Optional
-
-from netqasm.sdk.classical_communication.message import StructuredMessage
 from netqasm.sdk.external import NetQASMConnection, Socket
 from netqasm.sdk import EPRSocket
 from netqasm.sdk.toolbox.multi_node import create_ghz
 
+from ghz_batch import batches, sync_due, measure_ghz_batch, apply_corrections, recv_corrections
+from telemetry import Telemetry, timed
+from triplet_table import TripletTable
+from wire import WireStats, encode_bits, decode_bits, encode_outcomes, send_encoded, broadcast_encoded, recv_encoded
+
 import random
 
-def distribute_ghz_states(conn, down_epr_socket, down_socket, n_bits):
+def distribute_ghz_states(conn, down_epr_socket, down_socket, n_bits, sync_window=1, telemetry=None):
     bases = [random.randint(0, 1) for _ in range(n_bits)] # 0 = X, 1 = Y
     outcomes = [None for _ in range(n_bits)]
 
     for i in range(n_bits):
-        q, _ = create_ghz(
-            down_epr_socket=down_epr_socket,
-            down_socket=down_socket,
-            do_corrections=True
-        )
+        with timed(telemetry, "ghz"):
+            q, _ = create_ghz(
+                down_epr_socket=down_epr_socket,
+                down_socket=down_socket,
+                do_corrections=True
+            )
         if bases[i] == 1:
             q.rot_Z(n=3, d=1)
         q.H()
         m = q.measure()
-        conn.flush()
-        down_socket.recv_silent()
-        down_socket.send_silent("")
+        with timed(telemetry, "flush"):
+            conn.flush()
+        if sync_due(i, i + 1, n_bits, sync_window):
+            with timed(telemetry, "sync"):
+                down_socket.recv_silent()
+                down_socket.send_silent("")
         outcomes[i] = int(m)
 
     return bases, outcomes
 
-def exchange_bases(alice_socket, triplets_info):
-    charlie_bases = [triplet.charlie_basis for triplet in triplets_info]
+def distribute_ghz_batches(conn, down_epr_socket, down_socket, n_bits, batch_size, sync_window=1, stats=None, telemetry=None):
+    bases = [random.randint(0, 1) for _ in range(n_bits)] # 0 = X, 1 = Y
+    outcomes = []
+
+    for start, stop in batches(n_bits, batch_size):
+        with timed(telemetry, "ghz", stop - start):
+            batch_outcomes, _ = measure_ghz_batch(conn, bases[start:stop], down_epr_socket=down_epr_socket)
+        with timed(telemetry, "corrections", stop - start):
+            corrections = recv_corrections(down_socket, stats)
+        if sync_due(start, stop, n_bits, sync_window):
+            with timed(telemetry, "sync"):
+                down_socket.recv_silent()
+                down_socket.send_silent("")
+        outcomes.extend(apply_corrections(bases[start:stop], batch_outcomes, x_flips=corrections))
 
-    alice_socket.send_structured(StructuredMessage(header="Bases", payload=charlie_bases))
-    
-    alice_bases = alice_socket.recv_structured().payload
-    bob_bases = alice_socket.recv_structured().payload
+    return bases, outcomes
 
-    for i in range(len(triplets_info)):
-        triplets_info[i].alice_basis = alice_bases[i]
-        triplets_info[i].bob_basis = bob_bases[i]
+def exchange_bases(alice_socket, bob_socket, table, stats=None):
+    broadcast_encoded([alice_socket, bob_socket], "Bases", encode_bits, table.charlie_basis.tolist(), stats=stats)
     
-    return triplets_info
-
-def sift_bases(triplets_info):
-    for triplet in triplets_info:
-        if (triplet.alice_basis + triplet.bob_basis + triplet.charlie_basis) % 2 == 0:
-            triplet.is_valid = True
-        else:
-            triplet.is_valid = False
-
-    return triplets_info
+    table.set_bases("alice", recv_encoded(alice_socket, decode_bits, stats))
+    table.set_bases("bob", recv_encoded(bob_socket, decode_bits, stats))
+    
+    return table
 
-def send_outcomes_for_qber(socket, triplets_info, test_num_rounds):
-    valid_outcomes = list(map(
-        lambda triplet: (triplet.index, triplet.charlie_outcome),
-        list(filter(
-            lambda triplet: triplet.is_valid,
-            triplets_info
-        ))
-    ))
+def send_outcomes_for_qber(socket, table, test_num_rounds, stats=None):
+    valid_outcomes = table.test_outcomes("charlie", test_num_rounds)
 
-    socket.send_structured(StructuredMessage(header="Outcomes", payload=valid_outcomes[:test_num_rounds]))
+    send_encoded(socket, "Outcomes", encode_outcomes, table.num_rounds, valid_outcomes, stats=stats)
     
     return
 
-@dataclass
-class TripletInfo:
-    """Information that Alice has about one generated triplet.
-    The information is filled progressively during the protocol."""
-
-    # Index in list of all generated pairs.
-    index: int
-
-    # True if Bob and Charlie can deduct Alice's bit when they cooperate
-    is_valid: Optional[bool] = None
-
-    # Basis Alice measured in. 0 = X, 1 = Y.
-    alice_basis: Optional[int] = None
-
-    # Basis Bob measured in. 0 = X, 1 = Y.
-    bob_basis: Optional[int] = None
-
-    # Basis Charlie measured in. 0 = X, 1 = Y.
-    charlie_basis: Optional[int] = None
-
-    # Alice measurement outcome (0 or 1).
-    alice_outcome: Optional[int] = None
-
-    # Bob measurement outcome (0 or 1).
-    bob_outcome: Optional[int] = None
-
-    # Charlie measurement outcome (0 or 1).
-    charlie_outcome: Optional[int] = None
-
-def main(app_config=None, num_rounds=4, eve_intercept=0):
+def main(app_config=None, num_rounds=4, eve_intercept=0, batch_size=1, sync_window=1):
     # Initialize classical communication sockets
     alice_socket = Socket("charlie", "alice", log_config=app_config.log_config)
+    bob_socket = Socket("charlie", "bob", log_config=app_config.log_config)
 
     # Initialize quantum EPR socket for entanglement generation with Bob
     alice_epr_socket = EPRSocket("alice")
@@ -108,29 +81,30 @@ def main(app_config=None, num_rounds=4, eve_intercept=0):
         epr_sockets=[alice_epr_socket]
     )
 
+    wire_stats = WireStats()
+    telemetry = Telemetry()
+
     with charlie:
-        bases, outcomes = distribute_ghz_states(charlie, alice_epr_socket, alice_socket, num_rounds)
-
-    triplets_info = []
-    for i in range(num_rounds):
-        triplets_info.append(
-            TripletInfo(
-                index=i,
-                charlie_basis=bases[i],
-                charlie_outcome=outcomes[i]
-            )
-        )
+        if batch_size > 1:
+            bases, outcomes = distribute_ghz_batches(charlie, alice_epr_socket, alice_socket, num_rounds, batch_size, sync_window, wire_stats, telemetry)
+        else:
+            bases, outcomes = distribute_ghz_states(charlie, alice_epr_socket, alice_socket, num_rounds, sync_window, telemetry)
 
-    triplets_info = exchange_bases(alice_socket, triplets_info)
-    triplets_info = sift_bases(triplets_info)
+    table = TripletTable.from_measurements("charlie", bases, outcomes)
+    with timed(telemetry, "basis_exchange"):
+        table = exchange_bases(alice_socket, bob_socket, table, wire_stats).sift()
 
-    valid_amount = sum(list(map(lambda triplet: 1 if triplet.is_valid else 0, triplets_info)))
+    valid_amount = table.valid_amount
 
-    send_outcomes_for_qber(alice_socket, triplets_info, max(valid_amount // 4, 1))
+    with timed(telemetry, "outcome_exchange"):
+        send_outcomes_for_qber(alice_socket, table, max(valid_amount // 4, 1), wire_stats)
 
     return {
         "role": "charlie",
-        "num_rounds": num_rounds
+        "num_rounds": num_rounds,
+        **wire_stats.as_result(),
+        "telemetry": telemetry.as_result(),
+        "latency": telemetry.as_rows("charlie")
     }
 
 if __name__ == "__main__":
@@ -7,6 +7,10 @@ from netqasm.sdk.external import NetQASMConnection, Socket
 from netqasm.sdk import EPRSocket
 from netqasm.sdk.toolbox.multi_node import create_ghz
 
+from ghz_batch import batches, sync_due, future_values, measure_ghz_batch, send_corrections
+from telemetry import Telemetry, timed
+from wire import WireStats
+
 import random
 
 def forward_to_bob(conn, m, basis, forward_epr_socket, forward_socket):
@@ -33,30 +37,81 @@ def forward_to_bob(conn, m, basis, forward_epr_socket, forward_socket):
     
     conn.flush()
 
-    forward_socket.send_silent("")
-    forward_socket.recv_silent()
-
-def distribute_ghz_states(conn, up_epr_socket, up_socket, forward_epr_socket, forward_socket, n_bits):
+def distribute_ghz_states(conn, up_epr_socket, up_socket, forward_epr_socket, forward_socket, n_bits, sync_window=1, telemetry=None):
     bases = [random.randint(0, 1) for _ in range(n_bits)] # 0 = X, 1 = Y
 
     for i in range(n_bits):
-        q, _ = create_ghz(
-            up_epr_socket=up_epr_socket,
-            up_socket=up_socket,
-            do_corrections=True
-        )
+        with timed(telemetry, "ghz"):
+            q, _ = create_ghz(
+                up_epr_socket=up_epr_socket,
+                up_socket=up_socket,
+                do_corrections=True
+            )
         if bases[i] == 1:
             q.rot_Z(n=3, d=1)
         q.H()
         m = q.measure()
-        conn.flush()
-        forward_to_bob(conn, m, bases[i], forward_epr_socket, forward_socket)
-        up_socket.send_silent("")
-        up_socket.recv_silent()
+        with timed(telemetry, "flush"):
+            conn.flush()
+        with timed(telemetry, "forward"):
+            forward_to_bob(conn, m, bases[i], forward_epr_socket, forward_socket)
+        if sync_due(i, i + 1, n_bits, sync_window):
+            with timed(telemetry, "sync"):
+                forward_socket.send_silent("")
+                forward_socket.recv_silent()
+                up_socket.send_silent("")
+                up_socket.recv_silent()
+
+    return
+
+def forward_batch_to_bob(conn, outcomes, bases, forward_epr_socket, forward_socket, stats=None):
+    m1 = conn.new_array(len(outcomes))
+    m2 = conn.new_array(len(outcomes))
+
+    # A sequential post routine cannot allocate the local qubit, so the rounds are unrolled
+    # into one subroutine; the measurements free both qubits before the next round
+    for i, (m, basis) in enumerate(zip(outcomes, bases)):
+        epr_qubit = forward_epr_socket.create_keep()[0]
+
+        q = Qubit(conn)
+
+        if m == 1:
+            q.X()
+
+        q.H()
+        if basis == 1:
+            q.S()
+
+        # Teleportation protocol
+        q.cnot(epr_qubit)
+        q.H()
+        q.measure(future=m1.get_future_index(i))
+        epr_qubit.measure(future=m2.get_future_index(i))
+
+    conn.flush()
+
+    # Send classical corrections
+    send_corrections(forward_socket, future_values(m1, len(outcomes)), stats)
+    send_corrections(forward_socket, future_values(m2, len(outcomes)), stats)
+
+def distribute_ghz_batches(conn, up_epr_socket, up_socket, forward_epr_socket, forward_socket, n_bits, batch_size, sync_window=1, stats=None, telemetry=None):
+    bases = [random.randint(0, 1) for _ in range(n_bits)] # 0 = X, 1 = Y
+
+    for start, stop in batches(n_bits, batch_size):
+        with timed(telemetry, "ghz", stop - start):
+            outcomes, _ = measure_ghz_batch(conn, bases[start:stop], up_epr_socket=up_epr_socket)
+        with timed(telemetry, "forward", stop - start):
+            forward_batch_to_bob(conn, outcomes, bases[start:stop], forward_epr_socket, forward_socket, stats)
+        if sync_due(start, stop, n_bits, sync_window):
+            with timed(telemetry, "sync"):
+                forward_socket.send_silent("")
+                forward_socket.recv_silent()
+                up_socket.send_silent("")
+                up_socket.recv_silent()
 
     return
 
-def main(app_config=None, num_rounds=4, eve_intercept=0):
+def main(app_config=None, num_rounds=4, eve_intercept=0, batch_size=1, sync_window=1):
     # Initialize classical communication sockets
     alice_socket = Socket("eve", "alice", log_config=app_config.log_config)
     bob_socket = Socket("eve", "bob", log_config=app_config.log_config)
@@ -71,13 +126,22 @@ def main(app_config=None, num_rounds=4, eve_intercept=0):
         log_config=app_config.log_config,
         epr_sockets=[alice_epr_socket, bob_epr_socket]
     )
+    wire_stats = WireStats()
+    telemetry = Telemetry()
+
     if eve_intercept == 1:
         with eve:
-            distribute_ghz_states(eve, alice_epr_socket, alice_socket, bob_epr_socket, bob_socket, num_rounds)
+            if batch_size > 1:
+                distribute_ghz_batches(eve, alice_epr_socket, alice_socket, bob_epr_socket, bob_socket, num_rounds, batch_size, sync_window, wire_stats, telemetry)
+            else:
+                distribute_ghz_states(eve, alice_epr_socket, alice_socket, bob_epr_socket, bob_socket, num_rounds, sync_window, telemetry)
 
     return {
         "role": "eve",
-        "num_rounds": num_rounds
+        "num_rounds": num_rounds,
+        **wire_stats.as_result(),
+        "telemetry": telemetry.as_result(),
+        "latency": telemetry.as_rows("eve")
     }
 
 if __name__ == "__main__":
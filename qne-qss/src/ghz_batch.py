@@ -0,0 +1,64 @@
+from wire import encode_bits, decode_bits, send_encoded, recv_encoded
+
+def batches(n_bits, batch_size):
+    """Split range(n_bits) into consecutive (start, stop) windows of at most batch_size rounds."""
+    batch_size = max(batch_size, 1)
+    return [(start, min(start + batch_size, n_bits)) for start in range(0, n_bits, batch_size)]
+
+def sync_due(start, stop, n_bits, sync_window):
+    """True when the rounds [start, stop) close a window of sync_window rounds, or are the last ones.
+
+    Every round measures and frees its qubits, so memory never forces an earlier sync; the
+    window only bounds how far one party can run ahead of the others on the classical link."""
+    sync_window = max(sync_window, 1)
+    return stop == n_bits or stop // sync_window > start // sync_window
+
+def future_values(array, n):
+    """Read the first n entries of a netqasm array as plain ints, after the flush that filled it."""
+    return [int(f) for f in array.get_future_slice(slice(0, n))]
+
+def measure_ghz_batch(conn, bases, down_epr_socket=None, up_epr_socket=None):
+    """Create and measure len(bases) GHZ states in a single subroutine.
+
+    Follows the start/middle/end roles of netqasm's create_ghz, but puts all rounds in one
+    subroutine so the batch costs one flush instead of two per round. The corrections are not
+    applied to the qubits: a middle node returns its fusion outcomes, which the next node
+    applies classically with apply_corrections."""
+    n = len(bases)
+    outcomes = conn.new_array(n)
+    fusions = conn.new_array(n) if down_epr_socket is not None and up_epr_socket is not None else None
+
+    # Every role unrolls its rounds into number=1 requests: the middle node must, as a sequential
+    # post routine cannot issue a second EPR request, and both ends of a link need the same request
+    # shape. The measurements free each round's qubits before the next round starts
+    for i, basis in enumerate(bases):
+        if down_epr_socket is None:
+            q = up_epr_socket.create_keep()[0]
+        else:
+            q = down_epr_socket.recv_keep()[0]
+        if fusions is not None:
+            # Merge the states by doing half a Bell measurement
+            q_up = up_epr_socket.create_keep()[0]
+            q.cnot(q_up)
+            q_up.measure(future=fusions.get_future_index(i))
+
+        if basis == 1:
+            q.rot_Z(n=3, d=1)
+        q.H()
+        q.measure(future=outcomes.get_future_index(i))
+
+    conn.flush()
+    return future_values(outcomes, n), future_values(fusions, n) if fusions is not None else [0] * n
+
+def apply_corrections(bases, outcomes, x_flips, z_flips=None):
+    """Apply Pauli corrections after the measurement instead of before it.
+
+    An X correction only flips a Y basis outcome, a Z correction flips both X and Y outcomes."""
+    z_flips = z_flips or [0] * len(outcomes)
+    return [m ^ (x & b) ^ z for m, b, x, z in zip(outcomes, bases, x_flips, z_flips)]
+
+def send_corrections(socket, corrections, stats=None):
+    send_encoded(socket, "Corrections", encode_bits, corrections, stats=stats)
+
+def recv_corrections(socket, stats=None):
+    return recv_encoded(socket, decode_bits, stats=stats)
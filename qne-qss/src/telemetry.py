@@ -0,0 +1,89 @@
+import math
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+
+# Phases every app reports, in result view order, with the title of their row.
+PHASES = {
+    "ghz": "GHZ creation",
+    "flush": "Measurement flush",
+    "corrections": "Corrections",
+    "forward": "Eve forward",
+    "sync": "Sync wait",
+    "basis_exchange": "Basis exchange",
+    "outcome_exchange": "Outcome exchange"
+}
+
+@dataclass
+class LatencyHistogram:
+    """Durations bucketed by powers of two microseconds, bucket k holding [2^k, 2^(k+1)) us."""
+
+    count: int = 0
+    total: float = 0.0
+    max: float = 0.0
+    buckets: dict = field(default_factory=dict)
+
+    def record(self, seconds, rounds=1):
+        # A batch covering several rounds is recorded as that many rounds of its mean duration
+        per_round = seconds / rounds
+        bucket = max(0, math.floor(math.log2(per_round * 1e6))) if per_round > 0 else 0
+        self.buckets[bucket] = self.buckets.get(bucket, 0) + rounds
+        self.count += rounds
+        self.total += seconds
+        self.max = max(self.max, per_round)
+
+    def percentile(self, q):
+        """Upper edge of the bucket holding the q-th quantile, in seconds."""
+        if self.count == 0:
+            return 0.0
+        seen = 0
+        for bucket in sorted(self.buckets):
+            seen += self.buckets[bucket]
+            if seen >= q * self.count:
+                return min(2 ** (bucket + 1) * 1e-6, self.max)
+        return self.max
+
+    def as_result(self):
+        return {
+            "count": self.count,
+            "mean_ms": round(self.total / self.count * 1e3, 3) if self.count else 0.0,
+            "p50_ms": round(self.percentile(0.5) * 1e3, 3),
+            "p95_ms": round(self.percentile(0.95) * 1e3, 3),
+            "max_ms": round(self.max * 1e3, 3),
+            "histogram": [[round(2 ** (bucket + 1) * 1e-3, 3), self.buckets[bucket]] for bucket in sorted(self.buckets)]
+        }
+
+@dataclass
+class Telemetry:
+    """Wall clock latency histograms of one party, per protocol phase."""
+
+    phases: dict = field(default_factory=lambda: {phase: LatencyHistogram() for phase in PHASES})
+
+    def record(self, phase, seconds, rounds=1):
+        self.phases.setdefault(phase, LatencyHistogram()).record(seconds, rounds)
+
+    def as_result(self):
+        return {phase: histogram.as_result() for phase, histogram in self.phases.items()}
+
+    def as_rows(self, role):
+        """Rows of the shared latency table for the phases this party went through.
+
+        A party that skipped every phase, like Eve when she does not intercept, adds no rows."""
+        rows = []
+        for phase, histogram in self.phases.items():
+            if histogram.count:
+                result = histogram.as_result()
+                rows.append([role.capitalize(), PHASES.get(phase, phase), result["count"], result["mean_ms"], result["p50_ms"], result["p95_ms"], result["max_ms"]])
+        return rows
+
+@contextmanager
+def timed(telemetry, phase, rounds=1):
+    """Record the duration of the block under phase; does nothing without a telemetry object."""
+    if telemetry is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        telemetry.record(phase, time.perf_counter() - start, rounds)
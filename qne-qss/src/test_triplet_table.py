@@ -0,0 +1,83 @@
+import random
+
+import pytest
+
+from triplet_table import TripletTable
+
+N_ROUNDS = 400
+ROLES = ("alice", "bob", "charlie")
+
+def triplets(seed, ideal=False):
+    """Per-round dicts, the layout of the TripletInfo objects the table replaced."""
+    rng = random.Random(seed)
+    rounds = []
+    for index in range(N_ROUNDS):
+        bases = [rng.randint(0, 1) for _ in range(3)]
+        outcomes = [rng.randint(0, 1) for _ in range(3)]
+        if ideal and sum(bases) % 2 == 0:
+            outcomes[2] = outcomes[0] ^ outcomes[1] ^ (sum(bases) // 2 % 2)
+        rounds.append({"index": index, "bases": bases, "outcomes": outcomes})
+    return rounds
+
+def party_table(rounds, role):
+    """The table of one party after the basis exchange."""
+    position = ROLES.index(role)
+    table = TripletTable.from_measurements(role, [r["bases"][position] for r in rounds], [r["outcomes"][position] for r in rounds])
+    for other_position, other in enumerate(ROLES):
+        table.set_bases(other, [r["bases"][other_position] for r in rounds])
+    return table.sift()
+
+def alice_table(rounds, test_num_rounds):
+    table = party_table(rounds, "alice")
+    for role in ("bob", "charlie"):
+        table.set_outcomes(role, party_table(rounds, role).test_outcomes(role, test_num_rounds))
+    return table
+
+def loop_test_outcomes(rounds, position, test_num_rounds):
+    valid = [r for r in rounds if sum(r["bases"]) % 2 == 0]
+    return [(r["index"], r["outcomes"][position]) for r in valid[:test_num_rounds]]
+
+def loop_qber(rounds, test_num_rounds, all_x_bug=False):
+    correct = 0
+    for r in rounds[:max(index for index, _ in loop_test_outcomes(rounds, 0, test_num_rounds)) + 1]:
+        if sum(r["bases"]) % 2 != 0:
+            continue
+        xor = r["outcomes"][0] ^ r["outcomes"][1] ^ r["outcomes"][2]
+        if sum(r["bases"]) == 0:
+            # The old loop added xor % 2 + 1 here, counting an all-X error as two matches
+            correct += xor % 2 + 1 if all_x_bug else 1 - xor
+        else:
+            correct += xor
+    return 1 - correct / test_num_rounds
+
+@pytest.mark.parametrize("seed", [0, 1, 2])
+def test_sift_and_test_sample_match_loop(seed):
+    rounds = triplets(seed)
+    table = alice_table(rounds, 25)
+    assert table.is_valid.tolist() == [sum(r["bases"]) % 2 == 0 for r in rounds]
+    assert table.valid_amount == sum(sum(r["bases"]) % 2 == 0 for r in rounds)
+    assert table.test_outcomes("alice", 25) == loop_test_outcomes(rounds, 0, 25)
+
+@pytest.mark.parametrize("seed", [0, 1, 2])
+def test_qber_matches_loop(seed):
+    rounds = triplets(seed)
+    test_num_rounds = alice_table(rounds, 1).valid_amount // 4
+    table = alice_table(rounds, test_num_rounds)
+    assert table.qber(test_num_rounds) == pytest.approx(loop_qber(rounds, test_num_rounds))
+
+def test_qber_matches_old_loop_without_errors():
+    rounds = triplets(3, ideal=True)
+    test_num_rounds = alice_table(rounds, 1).valid_amount // 4
+    table = alice_table(rounds, test_num_rounds)
+    assert table.qber(test_num_rounds) == 0
+    assert loop_qber(rounds, test_num_rounds, all_x_bug=True) == 0
+
+@pytest.mark.parametrize("role", ROLES)
+def test_key_matches_loop(role):
+    rounds = triplets(4)
+    table = party_table(rounds, role)
+    position = ROLES.index(role)
+    tested = {index for index, _ in loop_test_outcomes(rounds, position, 30)}
+    expected = [r["outcomes"][position] for r in rounds if sum(r["bases"]) % 2 == 0 and r["index"] not in tested]
+    assert table.key(role, 30).tolist() == expected
+    assert len(expected) == table.valid_amount - 30
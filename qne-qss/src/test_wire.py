@@ -0,0 +1,23 @@
+import random
+
+import pytest
+
+pytest.importorskip("netqasm")
+
+from wire import decode_bits, decode_outcomes, encode_bits, encode_outcomes, pack_bits, unpack_bits
+
+@pytest.mark.parametrize("n_bits", [0, 1, 7, 8, 9, 100, 1001])
+def test_bits_round_trip(n_bits):
+    bits = [random.Random(n_bits).randint(0, 1) for _ in range(n_bits)]
+    assert decode_bits(encode_bits(bits)) == bits
+
+def test_pack_is_most_significant_first():
+    assert pack_bits([1, 0, 0, 0, 0, 0, 0, 1, 1]) == "gYA="
+    assert unpack_bits("gYA=", 9) == [1, 0, 0, 0, 0, 0, 0, 1, 1]
+
+@pytest.mark.parametrize("n_rounds, n_sampled", [(1, 0), (1, 1), (50, 13), (1000, 250)])
+def test_outcomes_round_trip(n_rounds, n_sampled):
+    rng = random.Random(n_rounds)
+    indexed_outcomes = [(index, rng.randint(0, 1)) for index in rng.sample(range(n_rounds), n_sampled)]
+    # Decoded pairs come back in index order, whatever order they were sent in
+    assert decode_outcomes(encode_outcomes(n_rounds, indexed_outcomes)) == sorted(indexed_outcomes)
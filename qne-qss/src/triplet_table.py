@@ -0,0 +1,88 @@
+from dataclasses import dataclass, field
+
+import numpy as np
+
+ROLES = ("alice", "bob", "charlie")
+
+# Value of a basis or outcome that this party has not learned (yet).
+UNKNOWN = -1
+
+def _column(num_rounds):
+    return np.full(num_rounds, UNKNOWN, dtype=np.int8)
+
+@dataclass
+class TripletTable:
+    """Information that one party has about all generated triplets, one array per field.
+    The columns are filled progressively during the protocol."""
+
+    # Number of generated triplets; row i is the triplet of round i.
+    num_rounds: int
+
+    # True if Bob and Charlie can deduct Alice's bit when they cooperate
+    is_valid: np.ndarray = field(init=False)
+
+    # Basis each party measured in. 0 = X, 1 = Y.
+    alice_basis: np.ndarray = field(init=False)
+    bob_basis: np.ndarray = field(init=False)
+    charlie_basis: np.ndarray = field(init=False)
+
+    # Measurement outcome of each party (0 or 1).
+    alice_outcome: np.ndarray = field(init=False)
+    bob_outcome: np.ndarray = field(init=False)
+    charlie_outcome: np.ndarray = field(init=False)
+
+    def __post_init__(self):
+        self.is_valid = np.zeros(self.num_rounds, dtype=bool)
+        for role in ROLES:
+            setattr(self, f"{role}_basis", _column(self.num_rounds))
+            setattr(self, f"{role}_outcome", _column(self.num_rounds))
+
+    @classmethod
+    def from_measurements(cls, role, bases, outcomes):
+        table = cls(len(bases))
+        table.set_bases(role, bases)
+        getattr(table, f"{role}_outcome")[:] = outcomes
+        return table
+
+    def set_bases(self, role, bases):
+        getattr(self, f"{role}_basis")[:] = bases
+
+    def set_outcomes(self, role, indexed_outcomes):
+        """Fill in the (index, outcome) pairs another party disclosed."""
+        if len(indexed_outcomes) > 0:
+            indices, outcomes = np.asarray(indexed_outcomes, dtype=np.int64).T
+            getattr(self, f"{role}_outcome")[indices] = outcomes
+
+    def sift(self):
+        """A round is valid when an even number of parties measured in Y."""
+        self.is_valid = ((self.alice_basis + self.bob_basis + self.charlie_basis) % 2) == 0
+        return self
+
+    @property
+    def valid_amount(self):
+        return int(np.count_nonzero(self.is_valid))
+
+    def test_indices(self, test_num_rounds):
+        """Rounds whose outcomes are disclosed to estimate the QBER: the first valid ones."""
+        return np.flatnonzero(self.is_valid)[:test_num_rounds]
+
+    def test_outcomes(self, role, test_num_rounds):
+        indices = self.test_indices(test_num_rounds)
+        return list(zip(indices.tolist(), getattr(self, f"{role}_outcome")[indices].tolist()))
+
+    def qber(self, test_num_rounds):
+        """Fraction of test rounds whose outcome parity differs from the GHZ prediction.
+
+        For a valid round the parity of the three outcomes is 0 when all parties measured X,
+        and 1 when two of them measured Y."""
+        compared = self.is_valid & (self.bob_outcome != UNKNOWN) & (self.charlie_outcome != UNKNOWN)
+        parity = (self.alice_outcome ^ self.bob_outcome ^ self.charlie_outcome)[compared]
+        expected = ((self.alice_basis + self.bob_basis + self.charlie_basis) // 2 % 2)[compared]
+        correct = np.count_nonzero(parity == expected)
+        return 1 - (correct / test_num_rounds)
+
+    def key(self, role, test_num_rounds):
+        """Outcomes of role on the valid rounds that were not disclosed for the QBER test."""
+        key_rounds = self.is_valid.copy()
+        key_rounds[self.test_indices(test_num_rounds)] = False
+        return getattr(self, f"{role}_outcome")[key_rounds]
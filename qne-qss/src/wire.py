@@ -0,0 +1,81 @@
+import base64
+import json
+import time
+from dataclasses import dataclass
+
+from netqasm.sdk.classical_communication.message import StructuredMessage
+
+@dataclass
+class WireStats:
+    """Classical traffic of one party, as serialized by the netqasm sockets."""
+
+    # Bytes of the JSON encoded messages sent and received.
+    bytes_sent: int = 0
+    bytes_received: int = 0
+
+    # Time spent packing and unpacking payloads, in seconds.
+    encode_seconds: float = 0.0
+    decode_seconds: float = 0.0
+
+    def as_result(self):
+        return {
+            "wire_bytes_sent": self.bytes_sent,
+            "wire_bytes_received": self.bytes_received,
+            "serialization_ms": round((self.encode_seconds + self.decode_seconds) * 1e3, 3)
+        }
+
+def pack_bits(bits):
+    """Pack a list of 0/1 values into a base64 string, 8 bits per byte, most significant first."""
+    packed = bytearray((len(bits) + 7) // 8)
+    for i, bit in enumerate(bits):
+        if bit:
+            packed[i >> 3] |= 0x80 >> (i & 7)
+    return base64.b64encode(bytes(packed)).decode("ascii")
+
+def unpack_bits(data, n_bits):
+    packed = base64.b64decode(data)
+    return [(packed[i >> 3] >> (7 - (i & 7))) & 1 for i in range(n_bits)]
+
+def encode_bits(bits):
+    return {"n": len(bits), "bits": pack_bits(bits)}
+
+def decode_bits(payload):
+    return unpack_bits(payload["bits"], payload["n"])
+
+def encode_outcomes(n_rounds, indexed_outcomes):
+    """Encode (index, outcome) pairs as a bitmap over all rounds plus the packed outcomes in index order."""
+    indexed_outcomes = sorted(indexed_outcomes)
+    mask = [0] * n_rounds
+    for index, _ in indexed_outcomes:
+        mask[index] = 1
+    return {"n": n_rounds, "mask": pack_bits(mask), "bits": pack_bits([outcome for _, outcome in indexed_outcomes])}
+
+def decode_outcomes(payload):
+    indices = [i for i, sampled in enumerate(unpack_bits(payload["mask"], payload["n"])) if sampled]
+    return list(zip(indices, unpack_bits(payload["bits"], len(indices))))
+
+def _message_size(msg):
+    # Same serialization as the netqasm thread sockets use on the wire
+    return len(json.dumps(msg.__dict__))
+
+def send_encoded(socket, header, encode, *args, stats=None):
+    broadcast_encoded([socket], header, encode, *args, stats=stats)
+
+def broadcast_encoded(sockets, header, encode, *args, stats=None):
+    """Encode the payload once and send it to every socket."""
+    start = time.perf_counter()
+    msg = StructuredMessage(header=header, payload=encode(*args))
+    if stats is not None:
+        stats.encode_seconds += time.perf_counter() - start
+        stats.bytes_sent += _message_size(msg) * len(sockets)
+    for socket in sockets:
+        socket.send_structured(msg)
+
+def recv_encoded(socket, decode, stats=None):
+    msg = socket.recv_structured()
+    start = time.perf_counter()
+    value = decode(msg.payload)
+    if stats is not None:
+        stats.decode_seconds += time.perf_counter() - start
+        stats.bytes_received += _message_size(msg)
+    return value